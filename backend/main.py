@@ -3,28 +3,51 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from starlette.responses import FileResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from src import *
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import uvicorn
 import logging
 import traceback
-from random import sample
 from io import BytesIO
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+import os
 
 load_dotenv()
 
 ensure_tables_exist()
 
-app = FastAPI(title="AInki - Spaced Repetition Learning", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_graph()
+    if QUESTION_PREGENERATION:
+        question_pregenerator.start()
+    ingestion_jobs.recover()
+    yield
+    question_pregenerator.stop(timeout=5)
+    ingestion_jobs.shutdown()
+    quiz_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="AInki - Spaced Repetition Learning", version="1.0.0", lifespan=lifespan)
 context_diff = 2
 truncate_after = 100
 PENDING_QUIZ_LIMIT = 5
 NO_QUESTION_GENERATION=False
+# Generate questions for soon-due items in the background instead of on the request path
+QUESTION_PREGENERATION = os.getenv("QUESTION_PREGENERATION", "true").lower() == "true"
+# Quiz items are built concurrently; items not ready within the deadline are skipped
+QUIZ_ITEM_TIMEOUT = float(os.getenv("QUIZ_ITEM_TIMEOUT", "8"))
+QUIZ_FANOUT_WORKERS = int(os.getenv("QUIZ_FANOUT_WORKERS", "16"))
+# Due items whose question could not be built are offered again after this many seconds
+QUIZ_RETRY_SECONDS = float(os.getenv("QUIZ_RETRY_SECONDS", "60"))
+# Due queue pops per request while filling freed slots
+DUE_QUIZ_ROUNDS = 3
+quiz_executor = ThreadPoolExecutor(max_workers=QUIZ_FANOUT_WORKERS, thread_name_prefix="quiz-item")
 
 # Add validation error handler to see detailed error messages
 @app.exception_handler(RequestValidationError)
@@ -63,6 +86,8 @@ readers = {
     "DefaultReader": DefaultReader,
     "MineruReader": MineruReader
 }
+# OCR, chunking and page mapping run in background workers; uploads only spool the file
+ingestion_jobs = IngestionJobs(readers)
 
 security = HTTPBearer()
 
@@ -94,10 +119,6 @@ class TrackRequest(BaseModel):
     track_element_end_idx: int | List[int]
     frontend_reader_type: str = "md"
 
-def lifespan(app: FastAPI):
-    init_graph()
-    yield
-
 # Authentication dependency
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
@@ -133,10 +154,10 @@ def login(user_data: UserLogin):
         raise HTTPException(status_code=401, detail=f"Login failed: {str(e)}")
 
 @app.get("/api/docs")
-def get_docs():
+def get_docs(current_user: str = Depends(get_current_user)):
     try:
         docs = get_all_docs()
-        has_quiz = len(get_all_pending()) > 0
+        has_quiz = get_due_count(current_user) > 0
         logger.info(f"Has quiz: {has_quiz}")
         return {"docs": docs, "has_quiz": has_quiz}
     except Exception as e:
@@ -168,65 +189,89 @@ def upload_file(
     current_user: str = Depends(get_current_user),
     reader: str = "DefaultReader"
 ):
+    if reader not in readers:
+        raise HTTPException(status_code=400, detail=f"Unknown reader {reader}")
     try:
-        reader = readers[reader]
         logger.info(f"Uploading file: {file.filename} for user: {current_user}")
-        
-        # Process file using your existing pipeline
 
-        # Read file content
-        content, result_folder = reader().read_file(file)
+        # Read the request body once, in blocks, into a spool file; the ingestion job owns it from here
+        upload = spool_upload(file.file, file.filename)
+        logger.info(f"Spooled {upload.size} bytes, sha256 {upload.sha256}")
+        job_id = ingestion_jobs.submit(current_user, upload, reader)
 
-        doc_id = insert_doc(file, result_folder, force=True)
-        if doc_id == -1:
-            raise HTTPException(status_code=400, detail="File already exists")
-        logger.info(f"Document inserted with ID: {doc_id}")
-        
-        # Store original PDF in Azure Blob Storage using generated doc_id
-        try:
-            try:
-                file.file.seek(0)
-            except Exception:
-                pass
-            store_file(doc_id, file)
-            logger.info(f"Stored PDF in blob storage as {doc_id}.pdf")
-        except Exception as storage_err:
-            logger.error(f"Failed to store PDF in blob storage: {storage_err}")
-            raise HTTPException(status_code=500, detail="Failed to store file in storage")
-
-        chunks = DefaultChunker().chunk(content)
-        insert_doc_chunks(chunks, doc_id, DefaultReader().name)
-        logger.info(f"Created {len(chunks)} chunks")
-
-        # objects = extract_objects_from_chunks(chunks[:10], doc_id) # Limit for testing
-        # logger.info(f"Extracted {len(objects)} objects")
-        
-        # object_nodes = insert_objects(objects)
-        # for object in object_nodes: merge_repetition_state(object.element_id, RepeatState(current_user, 0))
-        # logger.info("Objects inserted successfully")
-        
         return {
-            "message": "File processed successfully",
-            "doc_id": doc_id,
-            "chunks_count": len(chunks)
+            "message": "File queued for processing",
+            "job_id": job_id,
+            "status": "queued"
         }
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.get("/api/ingestion_jobs/{job_id}")
+def get_ingestion_job(job_id: int, current_user: str = Depends(get_current_user)):
+    job = get_job(job_id, current_user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "progress": job["progress"],
+        "doc_id": job["doc_id"],
+        "chunks_count": job["chunks_count"],
+        "deduplicated": job["deduplicated"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
 @app.get("/api/get_file")
-def get_file(doc_id: int):
+def get_file(doc_id: int, request: Request):
     try:
-        pdf_bytes = fet_file(doc_id)
-        return StreamingResponse(
-            BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'inline; filename="{doc_id}.pdf"'}
-        )
+        info = cached_file(doc_id)
+    except OSError as e:
+        logger.warning(f"File cache unavailable for {doc_id}: {e}")
+        info = None
     except Exception as e:
         logger.error(f"Get file error: {str(e)}")
         raise HTTPException(status_code=404, detail="File not found")
+    cached = info is not None
+    if not cached:
+        try:
+            info = stat_file(doc_id)
+        except Exception as e:
+            logger.error(f"Get file error: {str(e)}")
+            raise HTTPException(status_code=404, detail="File not found")
+
+    etag = quote_etag(info["etag"])
+    size, last_modified = info["size"], info["last_modified"]
+    disposition = {"Content-Disposition": f'inline; filename="{doc_id}.pdf"'}
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers={"ETag": etag, "Last-Modified": http_date(last_modified)})
+    if cached:
+        # Served from local disk; FileResponse handles Range itself and uses sendfile where available
+        return FileResponse(
+            info["path"],
+            media_type="application/pdf",
+            headers={"ETag": etag, "Last-Modified": http_date(last_modified), **disposition}
+        )
+    try:
+        byte_range = parse_range(request.headers, size, etag, last_modified)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    # Stream the blob block by block; the PDF viewer fetches pages with Range requests
+    start, end = byte_range if byte_range is not None else (0, None)
+    return StreamingResponse(
+        stream_file(doc_id, start, end),
+        status_code=206 if byte_range is not None else 200,
+        media_type="application/pdf",
+        headers={**file_headers(size, etag, last_modified, byte_range), **disposition}
+    )
 
 @app.post("/api/extract_objects_parameter")
 def extract_objects_parameter():
@@ -281,8 +326,11 @@ def process_track_background(current_user: str, request: TrackRequest):
         else:
             chunks_ids = list(range(request.track_element_end_idx[0], request.track_element_end_idx[1] + 1))
         
-        for chunk_id in chunks_ids: 
-            assign_objects(current_user, chunk_id, request.doc_id)
+        if not chunks_ids:
+            logger.info(f"No chunks to track for doc {request.doc_id}")
+            return
+        # Objects are assigned up to the furthest tracked chunk; only the interval past the user's mark is new
+        track_reading(current_user, request.doc_id, max(chunks_ids))
         
         logger.info(f"Background tracking completed for user {current_user}, doc {request.doc_id}")
     except Exception as e:
@@ -305,48 +353,112 @@ def track_page(
     # Return immediately without waiting for processing
     return {"message": "Page tracking started in background"}
 
-@app.get("/api/assigned", response_model=List[PendingItem])
-def get_assigned_items(current_user: str = Depends(get_current_user), doc_id: int = None):
-    try:
-        logger.info(f"Getting assigned items for user: {current_user}, doc_id: {doc_id}")
-        pending_records = get_all_assigned(current_user, doc_id)
-        if len(pending_records) > PENDING_QUIZ_LIMIT:
-            pending_records = sample(pending_records, PENDING_QUIZ_LIMIT)
-        logger.info(f"Sampled {len(pending_records)} pending records")
-        pending_items = []
-
-        for record in pending_records:
-            node = record["n"]
-            # Defensive doc_id filter (in case of query mismatch)
-            if doc_id is not None and node.get("doc_id") != doc_id:
+def make_pending_item(node, question, reference: str) -> PendingItem:
+    return PendingItem(
+        node_id=node.element_id,
+        name=node["name"],
+        question_id=question.element_id,
+        question=question["question"],
+        question_type=question["type"],
+        cognitive_focus=question["cognitive_focus"],
+        answer=question["answer"],
+        reference=reference,
+        doc_id=node["doc_id"],
+        chunk_start=node["chunk_id_s"],
+        chunk_end=node["chunk_id_e"]
+    )
+
+def generate_item_question(candidate, reference: str):
+    """Request-path fallback for a node whose questions were not pre-generated yet."""
+    node = candidate["n"]
+    question_type = sample_question_type(node.element_id, candidate["type_counts"])
+    logger.info(f"Question type: {question_type} ({type(question_type)})")
+    question_nodes = make_review_questions(node.element_id, question_type, node, reference)
+    return get_rand_review_question(node.element_id, question_nodes) if question_nodes else None
+
+def build_quiz_items(candidates) -> List[Optional[PendingItem]]:
+    """
+    Quiz item of each candidate, built with one SQL query for all reference texts. Nodes without
+    questions are generated concurrently; those not ready within QUIZ_ITEM_TIMEOUT seconds get
+    None (the question is still stored and used next time).
+    """
+    references = chunk_mapers([(c["n"]["doc_id"], c["n"]["chunk_id_s"], c["n"]["chunk_id_e"]) for c in candidates])
+    questions = [c["question"] for c in candidates]
+
+    missing = [i for i, question in enumerate(questions) if question is None]
+    if missing and not NO_QUESTION_GENERATION:
+        futures = {i: quiz_executor.submit(generate_item_question, candidates[i], references[i]) for i in missing}
+        wait(futures.values(), timeout=QUIZ_ITEM_TIMEOUT)
+        for i, future in futures.items():
+            node_id = candidates[i]["n"].element_id
+            if not future.done():
+                logger.warning(f"Question for node {node_id} missed the {QUIZ_ITEM_TIMEOUT}s deadline, skipping")
                 continue
-            question_type = sample_question_type(node.element_id) if not NO_QUESTION_GENERATION else None
-            logger.info(f"Question type: {question_type} ({type(question_type)})")
-            question_nodes = make_review_questions(node.element_id, question_type) if not NO_QUESTION_GENERATION else None
             try:
-                question = get_rand_review_question(node.element_id, question_nodes)
+                questions[i] = future.result()
             except Exception as e:
-                question = None
-            if question is None:
-                logger.error(f"No questions generated for node {node.element_id}")
+                logger.error(f"Failed to generate question for node {node_id}: {e}")
+
+    items = []
+    for candidate, question, reference in zip(candidates, questions, references):
+        if question is None:
+            logger.error(f"No questions generated for node {candidate['n'].element_id}")
+            items.append(None)
+            continue
+        items.append(make_pending_item(candidate["n"], question, reference))
+    return items
+
+def assemble_due_quiz(userid: str, doc_id: int = None) -> List[PendingItem]:
+    """
+    Up to PENDING_QUIZ_LIMIT of the most overdue items. The in-memory due queue only suggests
+    nodes; the graph decides. Nodes that are gone are dropped from the queue, nodes answered
+    elsewhere are re-keyed to their stored next_repeat, and nodes without a question are retried
+    after QUIZ_RETRY_SECONDS. Freed slots are filled from the next due nodes.
+    """
+    pending_items = []
+    for _ in range(DUE_QUIZ_ROUNDS):
+        node_ids = due_queue.pop_due(userid, PENDING_QUIZ_LIMIT - len(pending_items), doc_id)
+        if not node_ids:
+            break
+        found = {c["n"].element_id: c for c in get_quiz_candidates(userid, node_ids=node_ids)}
+        now = datetime.now(timezone.utc)
+        candidates = []
+        for node_id in node_ids:
+            candidate = found.get(node_id)
+            if candidate is None:
+                due_queue.remove(userid, node_id)
+                continue
+            next_repeat = candidate["r"]["next_repeat"].to_native()
+            if next_repeat >= now:
+                due_queue.update(userid, node_id, candidate["n"]["doc_id"], next_repeat)
                 continue
-            logger.info(f"Question: {question}")
-            reference = chunk_maper(node["doc_id"], node["chunk_id_s"], node["chunk_id_e"])
-
-            pending_items.append(PendingItem(
-                node_id=node.element_id,
-                name=node["name"],
-                question_id=question.element_id,
-                question=question["question"],
-                question_type=question["type"],
-                cognitive_focus=question["cognitive_focus"],
-                answer=question["answer"],
-                reference=reference,
-                doc_id=node["doc_id"],
-                chunk_start=node["chunk_id_s"],
-                chunk_end=node["chunk_id_e"]
-            ))
+            candidates.append(candidate)
+        for candidate, item in zip(candidates, build_quiz_items(candidates)):
+            if item is None:
+                due_queue.update(userid, candidate["n"].element_id, candidate["n"]["doc_id"],
+                                 now + timedelta(seconds=QUIZ_RETRY_SECONDS))
+            else:
+                pending_items.append(item)
+        if len(pending_items) >= PENDING_QUIZ_LIMIT:
+            break
+    return pending_items
+
+def assemble_quiz(userid: str, doc_id: int = None, due_only: bool = True) -> List[PendingItem]:
+    """
+    Build up to PENDING_QUIZ_LIMIT quiz items with one Cypher query (sampled records with an
+    existing question each) and one SQL query (all reference texts).
+    """
+    if due_only:
+        return assemble_due_quiz(userid, doc_id)
+    candidates = get_quiz_candidates(userid, doc_id, PENDING_QUIZ_LIMIT, due_only)
+    logger.info(f"Sampled {len(candidates)} pending records")
+    return [item for item in build_quiz_items(candidates) if item is not None]
 
+@app.get("/api/assigned", response_model=List[PendingItem])
+def get_assigned_items(current_user: str = Depends(get_current_user), doc_id: int = None):
+    try:
+        logger.info(f"Getting assigned items for user: {current_user}, doc_id: {doc_id}")
+        pending_items = assemble_quiz(current_user, doc_id, due_only=False)
         logger.info(f"Returning {len(pending_items)} pending items")
         return pending_items
     except Exception as e:
@@ -359,44 +471,7 @@ def get_assigned_items(current_user: str = Depends(get_current_user), doc_id: in
 def get_pending_items(current_user: str = Depends(get_current_user), doc_id: int = None):
     try:
         logger.info(f"Getting pending items for user: {current_user}, doc_id: {doc_id}")
-        pending_records = get_all_pending(current_user, doc_id)
-        if len(pending_records) > PENDING_QUIZ_LIMIT:
-            pending_records = sample(pending_records, PENDING_QUIZ_LIMIT)
-        logger.info(f"Sampled {len(pending_records)} pending records")
-        pending_items = []
-
-        for record in pending_records:
-            node = record["n"]
-            # Defensive doc_id filter (in case of query mismatch)
-            if doc_id is not None and node.get("doc_id") != doc_id:
-                continue
-            question_type = sample_question_type(node.element_id) if not NO_QUESTION_GENERATION else None
-            logger.info(f"Question type: {question_type} ({type(question_type)})")
-            question_nodes = make_review_questions(node.element_id, question_type) if not NO_QUESTION_GENERATION else None
-            try:
-                question = get_rand_review_question(node.element_id, question_nodes)
-            except Exception as e:
-                question = None
-            if question is None:
-                logger.error(f"No questions generated for node {node.element_id}")
-                continue
-            logger.info(f"Question: {question}")
-            reference = chunk_maper(node["doc_id"], node["chunk_id_s"], node["chunk_id_e"])
-
-            pending_items.append(PendingItem(
-                node_id=node.element_id,
-                name=node["name"],
-                question_id=question.element_id,
-                question=question["question"],
-                question_type=question["type"],
-                cognitive_focus=question["cognitive_focus"],
-                answer=question["answer"],
-                reference=reference,
-                doc_id=node["doc_id"],
-                chunk_start=node["chunk_id_s"],
-                chunk_end=node["chunk_id_e"]
-            ))
-
+        pending_items = assemble_quiz(current_user, doc_id, due_only=True)
         logger.info(f"Returning {len(pending_items)} pending items")
         return pending_items
     except Exception as e:
@@ -406,8 +481,7 @@ def get_pending_items(current_user: str = Depends(get_current_user), doc_id: int
 
 @app.get("/api/total_pending")
 def get_total_pending(current_user: str = Depends(get_current_user)):
-    pending = get_all_pending(current_user)
-    return len(pending)
+    return get_due_count(current_user)
 
 @app.get("/api/mastery")
 def get_mastery(current_user: str = Depends(get_current_user), doc_id: int = 0):
@@ -415,13 +489,14 @@ def get_mastery(current_user: str = Depends(get_current_user), doc_id: int = 0):
 
 @app.post("/api/quiz/answer")
 def submit_answer(
-    answer: QuizAnswer
+    answer: QuizAnswer,
+    current_user: str = Depends(get_current_user)
 ):
     try:
         logger.info(f"Submitting answer for node {answer.node_id}, correct: {answer.correct}")
         
         # Process the answer using your existing logic
-        check_answer(answer)
+        check_answer(answer, current_user)
         logger.info("Answer processed successfully")
         
         return {"message": "Answer recorded successfully"}
@@ -446,6 +521,21 @@ def debug_routes():
             })
     return {"routes": routes}
 
+# Debug endpoint exposing cache and pool counters
+@app.get("/api/debug/stats")
+def debug_stats():
+    return {
+        "llm_cache": llm_cache_stats(),
+        "reader_cache": reader_cache_stats(),
+        "file_cache": file_cache_stats(),
+        "pg_pool": pool_stats(),
+        "reference_cache": reference_cache_stats(),
+        "mastery_cache": mastery_cache_stats(),
+        "due_counts": due_count_stats(),
+        "due_queue": due_queue.stats(),
+        "question_pregeneration": question_pregenerator.stats()
+    }
+
 # Debug endpoint to test logging
 @app.get("/api/debug/log")
 def debug_log():
@@ -1,22 +1,36 @@
 from .chunk_db import insert_chunk, get_chunks, insert_doc_chunks
-from .docs_db import insert_doc, get_all_docs, get_doc
-from .user_db import insert_user, authorize_user, assign_objects
+from .docs_db import insert_doc, find_doc_by_hash, delete_doc, get_all_docs, get_doc
+from .user_db import insert_user, authorize_user, assign_objects, track_reading
 from .neo4j_graph import init_graph
 from .object_extractor import insert_objects, extract_objects_from_chunks, make_study_object, prompts_available, price_approximation
 from .repetition import RepeatState
-from .neo4j_graph import get_all_pending, merge_repetition_state
+from .neo4j_graph import get_all_pending, merge_repetition_state, merge_repetition_states
 from .ask import check_answer, QuizAnswer
 from .chunker import DefaultChunker
 from .file_reader import DefaultReader, MineruReader
-from .chunk_maper import chunk_maper, map_to_pages, chunks_in_page, map_to_pages_doc_intelligence
+from .chunk_maper import chunk_maper, chunk_mapers, reference_cache_stats, map_to_pages, chunks_in_page, map_to_pages_doc_intelligence
 from .question_maker import make_review_questions, sample_question_type
-from .neo4j_graph import get_rand_review_question, get_page_mastery, get_all_assigned
+from .neo4j_graph import get_rand_review_question, get_review_questions, get_quiz_candidates, get_all_assigned
+from .mastery import get_page_mastery, get_chunk_mastery, mastery_cache_stats
+from .due_counts import get_due_count, due_count_stats
+from .due_queue import due_queue, DueQueue
+from .question_scheduler import question_pregenerator, QuestionPregenerator
 from .schema_setup import ensure_tables_exist
-from .pdf_storage import store_file, fet_file
+from .pdf_storage import store_file, fet_file, stat_file, stream_file, cached_file, delete_file
+from .storage import get_storage, StorageBackend, LocalStorage, AzureBlobStorage
+from .file_cache import file_cache_stats
+from .range_requests import parse_range, is_not_modified, file_headers, quote_etag, http_date, RangeNotSatisfiable
+from .upload_spool import spool_upload, SpooledUpload
+from .ingestion_jobs import IngestionJobs, get_job
+from .llm_cache import llm_cache_stats
+from .reader_cache import reader_cache_stats
+from .pg_connection import pool_stats
 
 __all__ = [
     "insert_chunk",
     "insert_doc",
+    "find_doc_by_hash",
+    "delete_doc",
     "get_all_docs",
     "get_doc",
     "get_chunks",
@@ -34,18 +48,54 @@ __all__ = [
     "check_answer",
     "DefaultReader", "DefaultChunker", "MineruReader",
     "merge_repetition_state",
+    "merge_repetition_states",
     "chunk_maper",
+    "chunk_mapers",
+    "reference_cache_stats",
     "QuizAnswer",
     "assign_objects",
+    "track_reading",
     "map_to_pages",
     "chunks_in_page",
     "make_review_questions",
     "sample_question_type",
     "get_rand_review_question",
+    "get_review_questions",
+    "get_quiz_candidates",
+    "question_pregenerator",
+    "QuestionPregenerator",
     "get_page_mastery",
+    "get_chunk_mastery",
+    "mastery_cache_stats",
+    "get_due_count",
+    "due_count_stats",
+    "due_queue",
+    "DueQueue",
     "ensure_tables_exist",
     "map_to_pages_doc_intelligence",
     "get_all_assigned",
     "store_file",
-    "fet_file"
+    "fet_file",
+    "stat_file",
+    "stream_file",
+    "cached_file",
+    "delete_file",
+    "get_storage",
+    "StorageBackend",
+    "LocalStorage",
+    "AzureBlobStorage",
+    "file_cache_stats",
+    "parse_range",
+    "is_not_modified",
+    "file_headers",
+    "quote_etag",
+    "http_date",
+    "RangeNotSatisfiable",
+    "spool_upload",
+    "SpooledUpload",
+    "IngestionJobs",
+    "get_job",
+    "llm_cache_stats",
+    "reader_cache_stats",
+    "pool_stats"
 ]
\ No newline at end of file
@@ -1,5 +1,7 @@
 from .neo4j_graph import Node, driver, merge_repetition_state
 from .repetition import RepeatState
+from .mastery import update_mastery
+from .due_counts import invalidate_due_count
 from pydantic import BaseModel
 
 class QuizAnswer(BaseModel):
@@ -7,29 +9,34 @@ class QuizAnswer(BaseModel):
     correct: bool
     question_id: str
 
-def check_answer(answer: QuizAnswer):
+def check_answer(answer: QuizAnswer, userid: str = None):
+    user_filter = "AND r.userid = $userid" if userid is not None else ""
     state_node = driver.execute_query(
-        """
-        MATCH (n)-[c:LAST_REPEATED]->(r:RepetitionState)
-        WHERE elementId(n) = $node_id
-        RETURN r
+        f"""
+        MATCH (n:BookKnowledge)-[c:LAST_REPEATED]->(r:RepetitionState)
+        WHERE elementId(n) = $node_id {user_filter}
+        RETURN n, r
         """,
-        node_id = answer.node_id
+        node_id = answer.node_id, userid = userid
     )
+    node = state_node.records[0]["n"]
     state_node = state_node.records[0]["r"]
-    state = int(state_node.get("state"))
+    old_state = int(state_node.get("state"))
+    state = old_state
     if answer.correct:
         state += 1
     else:
         state = max(state - 1, 0)
     state = RepeatState(state_node.get("userid"), state)
     merge_repetition_state(answer.node_id, state)
+    update_mastery(state.userid, node["doc_id"], node["chunk_id_s"], node["chunk_id_e"], old_state, state.state)
+    invalidate_due_count(state.userid)
 
     set_query = "SET n.asked = n.asked + 1"
     if answer.correct:
         set_query += ", n.correct = n.correct + 1"
     query = f"""
-        MATCH (n)
+        MATCH (n:ReviewQuestion)
         WHERE elementId(n) = $question_id
         {set_query}
     """
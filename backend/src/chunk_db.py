@@ -1,13 +1,16 @@
 import os
 from dotenv import load_dotenv
 import psycopg2
-from .pg_connection import get_connection
-from typing import List, Dict
-from.chunk_maper import map_to_pages
+from psycopg2.extras import execute_values
+from .pg_connection import connection
+from typing import List, Dict, Tuple
+from.chunk_maper import map_to_pages, invalidate_references
+from .mastery import invalidate_mastery
+
+insert_page_size = 500
 
 def insert_chunk(chunk: str, page_idx: int, doc_id: int, order_idx: int, reader_name: str) -> int:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO public.chunks (content, doc_id, order_idx, page_idx, reader)
@@ -17,13 +20,40 @@ def insert_chunk(chunk: str, page_idx: int, doc_id: int, order_idx: int, reader_
             (chunk, doc_id, order_idx, page_idx, reader_name)
         )
         id = cursor.fetchone()[0]
-        conn.commit()
     return id
 
-def insert_doc_chunks(chunks: List[str], doc_id: int, reader_name: str) -> int:
-    conn = get_connection()
-    # Deactivating other chunks in the same document
-    with conn.cursor() as cursor:
+def bulk_insert_chunks(cursor, chunks: List[str], page_mapping: List[int], doc_id: int, reader_name: str) -> List[int]:
+    """
+    Insert all chunks of a document with multi-row INSERTs on the given cursor.
+    Does not commit. Returns generated ids in chunk order.
+    """
+    rows = execute_values(
+        cursor,
+        """
+        INSERT INTO public.chunks (content, doc_id, order_idx, page_idx, reader)
+        VALUES %s
+        RETURNING id, order_idx;
+        """,
+        [(chunk, doc_id, idx, page_mapping[idx], reader_name) for idx, chunk in enumerate(chunks)],
+        page_size=insert_page_size,
+        fetch=True
+    )
+    return [row[0] for row in sorted(rows, key=lambda row: row[1])]
+
+def insert_doc_chunks(chunks: List[str], doc_id: int, reader_name: str, offsets: List[Tuple[int, int]] = None,
+                      sha256: str = None) -> List[int]:
+    """
+    Replace the active chunks of a document. Deactivation and inserts share one
+    transaction so readers never see the document without active chunks.
+    offsets: (start, end) of each chunk in the read content, used for page mapping.
+    sha256: content hash recorded on the document in the same transaction, which makes it
+    visible to deduplication only once its chunks exist. Raises UniqueViolation if another
+    document already holds the hash.
+    Returns ids of the inserted chunks in order.
+    """
+    page_mapping = map_to_pages(doc_id, chunks, reader_name, offsets)
+    with connection() as conn, conn.cursor() as cursor:
+        # Deactivating other chunks in the same document
         cursor.execute(
             """
             UPDATE public.chunks
@@ -31,21 +61,27 @@ def insert_doc_chunks(chunks: List[str], doc_id: int, reader_name: str) -> int:
             WHERE doc_id = %s
             """, (doc_id,)
         )
-        conn.commit()
-    page_mapping = map_to_pages(doc_id, chunks, reader_name)
-    for idx, chunk in enumerate(chunks):
-        insert_chunk(chunk, page_mapping[idx], doc_id, idx, reader_name)
-    return len(chunks)
+        ids = bulk_insert_chunks(cursor, chunks, page_mapping, doc_id, reader_name)
+        if sha256 is not None:
+            cursor.execute("UPDATE public.docs_metadata SET sha256 = %s WHERE id = %s", (sha256, doc_id))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Document {doc_id} was removed during ingestion")
+    invalidate_references(doc_id)
+    invalidate_mastery(doc_id)
+    return ids
 
 def get_max_chunk_order(doc_id: int) -> int:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute("SELECT MAX(order_idx) FROM public.chunks WHERE doc_id = %s", (doc_id,))
         return cursor.fetchone()[0]
 
+def count_active_chunks(doc_id: int) -> int:
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM public.chunks WHERE doc_id = %s AND "active?"', (doc_id,))
+        return cursor.fetchone()[0]
+
 def get_chunks(doc_id: int, chunk_ids: List[int] = None) -> List[Dict]:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         if chunk_ids is None:
             cursor.execute("SELECT id, content, order_idx FROM public.chunks WHERE doc_id = %s ORDER BY order_idx ASC", (doc_id,))
         else:
@@ -1,14 +1,47 @@
-from .pg_connection import get_connection
-from .paths import make_content_path
-from typing import List
-import json, re
+from .pg_connection import connection
+from .paths import make_content_path, make_markdown_path
+from .lru_cache import ByteLRUCache
+from typing import List, Tuple, Dict, Optional
+import json, re, os
+import threading
 import pandas as pd
+import numpy as np
 from .chunker import DefaultChunker
 
+# Reference texts keyed by (doc_id, chunk_id_s, chunk_id_e); chunks only change when a document is re-chunked
+reference_cache = ByteLRUCache(
+    int(float(os.getenv("REFERENCE_CACHE_MAX_MB", "64")) * 1048576),
+    lambda text: len(text.encode("utf-8"))
+)
+# Bumped on invalidation so a read racing with re-chunking does not repopulate stale text
+_doc_generation: Dict[int, int] = {}
+_generation_lock = threading.Lock()
+
+def _generation(doc_id: int) -> int:
+    with _generation_lock:
+        return _doc_generation.get(doc_id, 0)
+
+def invalidate_references(doc_id: int) -> int:
+    """Drop cached reference texts of a document. Called whenever its chunks are replaced."""
+    with _generation_lock:
+        _doc_generation[doc_id] = _doc_generation.get(doc_id, 0) + 1
+    return reference_cache.invalidate(lambda key: key[0] == doc_id)
+
+def _cache_reference(key: Tuple[int, int, int], content: str, generation: int) -> None:
+    if _generation(key[0]) == generation:
+        reference_cache.put(key, content)
+
+def reference_cache_stats() -> Dict:
+    return reference_cache.stats()
+
 def chunk_maper(doc_id: int, chunk_id_s: int, chunk_id_e: int) -> str:
-    conn = get_connection()
+    key = (doc_id, chunk_id_s, chunk_id_e)
+    content = reference_cache.get(key)
+    if content is not None:
+        return content
+    generation = _generation(doc_id)
     content = ""
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             SELECT content FROM public.chunks WHERE doc_id = %s AND order_idx BETWEEN %s AND %s
@@ -17,29 +50,171 @@ def chunk_maper(doc_id: int, chunk_id_s: int, chunk_id_e: int) -> str:
         )
         for row in cursor.fetchall():
             content += row[0]
+    _cache_reference(key, content, generation)
     return content
 
+def chunk_mapers(ranges: List[Tuple[int, int, int]]) -> List[str]:
+    """
+    Reference text for many (doc_id, chunk_id_s, chunk_id_e) ranges.
+    Cached ranges are served from memory, the rest with one query.
+    Returns texts in input order ("" for ranges without chunks).
+    """
+    results = [reference_cache.get(tuple(key)) for key in ranges]
+    idxs = [idx for idx, content in enumerate(results) if content is None]
+    if not idxs:
+        return results
+    generations = {ranges[idx][0]: _generation(ranges[idx][0]) for idx in idxs}
+    doc_ids, starts, ends = (list(column) for column in zip(*(ranges[idx] for idx in idxs)))
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT r.idx, string_agg(c.content, '' ORDER BY c.order_idx)
+            FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[]) AS r(idx, doc_id, chunk_id_s, chunk_id_e)
+            JOIN public.chunks c ON c.doc_id = r.doc_id AND c.order_idx BETWEEN r.chunk_id_s AND r.chunk_id_e
+            GROUP BY r.idx
+            """,
+            (idxs, doc_ids, starts, ends)
+        )
+        contents = dict(cursor.fetchall())
+    for idx in idxs:
+        key = tuple(ranges[idx])
+        results[idx] = contents.get(idx, "")
+        _cache_reference(key, results[idx], generations[key[0]])
+    return results
+
+content_list_columns = ["page_idx", "text", "text_level"]
+
+def read_content_list(path: str, block_size: int = 1048576) -> pd.DataFrame:
+    """
+    Parse a MinerU content list (a JSON array of objects) incrementally, keeping only the
+    columns page conversion needs, so the raw file is never held in memory at once.
+    """
+    decoder = json.JSONDecoder()
+    columns = {name: [] for name in content_list_columns}
+    buffer = ""
+    position = 0
+    started = False
+    with open(path, "r", encoding="utf-8") as f:
+        eof = False
+        while True:
+            # Skip separators between items
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                break
+            try:
+                if position >= len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                block = f.read(block_size)
+                eof = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            for name in content_list_columns:
+                columns[name].append(item.get(name))
+    df = pd.DataFrame(columns)
+    df["text_level"] = pd.to_numeric(df["text_level"])
+    return df
+
+def _page_groups(page_idx: np.ndarray) -> Tuple[np.ndarray, int]:
+    # A new page starts whenever a row's page_idx differs from the number of pages completed so far
+    groups = np.empty(len(page_idx), dtype=np.int64)
+    completed = 0
+    for i, page in enumerate(page_idx.tolist()):
+        if page != completed:
+            completed += 1
+        groups[i] = completed
+    return groups, completed + 1
+
 def from_content_to_pages(df: pd.DataFrame) -> List[str]:
-    pages = []
-    current = ""
-    df_i = 0
-    while df_i < len(df):
-        if df.loc[df_i, 'page_idx'] != len(pages):
-            pages.append(current)
-            current = ""
-        current += "\n\n"  if df.loc[df_i, 'text'] != "" else ""
-        if pd.isna(df.loc[df_i, 'text_level']):
-            current += df.loc[df_i, 'text'].strip()
-        else:
-            current += f"{"#" * int(df.loc[df_i, 'text_level'])} {df.loc[df_i, 'text'].strip()}"
-        df_i += 1
-    pages.append(current)
+    """
+    Markdown text of each page: every item is "\n\n" (if it has text), a "# " prefix repeated
+    text_level times for headers, and its stripped text; items are joined per page.
+    """
+    if len(df) == 0:
+        return [""]
+    text = df["text"].fillna("").astype(str) if "text" in df else pd.Series("", index=df.index)
+    levels = df["text_level"] if "text_level" in df else pd.Series(np.nan, index=df.index)
+    separators = np.where(text != "", "\n\n", "")
+    is_header = levels.notna()
+    headers = pd.Series("", index=df.index, dtype=object)
+    headers[is_header] = pd.Series("#", index=df.index)[is_header].str.repeat(levels[is_header].astype(int)) + " "
+    pieces = separators + headers + text.str.strip()
+
+    groups, n_pages = _page_groups(df["page_idx"].to_numpy())
+    joined = pd.Series(pieces.to_numpy(), index=groups).groupby(level=0, sort=True).agg("".join)
+    pages = [""] * n_pages
+    for page, content in joined.items():
+        pages[page] = content
     return pages
 
+def assign_pages(page_lengths: List[int], chunks: List[str], offsets: Optional[List[Tuple[int, int]]] = None) -> List[int]:
+    """
+    Page of each chunk: the page holding its last character, found by binary search over
+    cumulative page ends. offsets are (start, end) of each chunk in the text; without them
+    chunks are taken to be consecutive from the start of the text.
+    """
+    page_ends = np.cumsum(np.asarray(page_lengths, dtype=np.int64))
+    if offsets is not None:
+        chunk_ends = np.fromiter((end for _, end in offsets), dtype=np.int64, count=len(offsets))
+    else:
+        chunk_ends = np.cumsum(np.fromiter((len(chunk) for chunk in chunks), dtype=np.int64, count=len(chunks)))
+    pages = np.searchsorted(page_ends, chunk_ends, side="left")
+    return np.minimum(pages, max(len(page_ends) - 1, 0)).tolist()
+
+def page_starts(markdown: str, df: pd.DataFrame, window: int = 65536) -> np.ndarray:
+    """
+    Offset in the MinerU markdown where each page of the content list begins. Items are located
+    in order, each searched for at most `window` characters past the previous one, so one pass
+    over the markdown suffices. Pages without a located item start where the next page does.
+    """
+    if len(df) == 0:
+        return np.zeros(1, dtype=np.int64)
+    groups, n_pages = _page_groups(df["page_idx"].to_numpy())
+    texts = df["text"].fillna("").astype(str).str.strip().tolist()
+    starts = np.full(n_pages, len(markdown), dtype=np.int64)
+    cursor = 0
+    for page, text in zip(groups.tolist(), texts):
+        if not text:
+            continue
+        found = markdown.find(text, cursor, cursor + window + len(text))
+        if found == -1:
+            continue
+        starts[page] = min(starts[page], found)
+        cursor = found + len(text)
+    starts = np.minimum.accumulate(starts[::-1])[::-1]
+    starts[0] = 0
+    return starts
+
+def _dump_pages(doc_id: int, df: pd.DataFrame) -> None:
+    # Opt-in debug output, one file pair per document
+    dump_dir = os.getenv("PAGE_MAPPING_DUMP_DIR")
+    if not dump_dir:
+        return
+    pages = from_content_to_pages(df)
+    os.makedirs(dump_dir, exist_ok=True)
+    with open(os.path.join(dump_dir, f"{doc_id}_page.json"), 'w') as f:
+        json.dump(pages, f, indent=4)
+    with open(os.path.join(dump_dir, f"{doc_id}_content.txt"), 'w', encoding='utf-8') as f:
+        f.write("".join(pages))
+
 # TODO: Make it for each reader
-def map_to_pages_mineru(doc_id: int, chunks: List[str]) -> List[int]:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+def map_to_pages_mineru(doc_id: int, chunks: List[str], offsets: Optional[List[Tuple[int, int]]] = None) -> List[int]:
+    """
+    Page of each chunk from its (start, end) offsets in the MinerU markdown, which the chunker
+    read. Page boundaries in the markdown come from the content list (see page_starts).
+    """
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             SELECT name, folder FROM public.docs_metadata WHERE id = %s
@@ -50,32 +225,14 @@ def map_to_pages_mineru(doc_id: int, chunks: List[str]) -> List[int]:
             name, folder = cursor.fetchone()
         except:
             raise ValueError(f"No document with id {doc_id} found")
-    path = make_content_path(name, folder)
-    df = pd.read_json(path)
-    pages = from_content_to_pages(df)
-    with open('page.json', 'w') as f:
-        json.dump(pages, f, indent=4)
-    all_content = "".join(pages)
-    with open('content.txt', 'w', encoding='utf-8') as f:
-        f.write(all_content)
-    page_mapping = []
-    offset = 0
-    for page in pages:
-        page_mapping.append(offset + len(page))
-        offset += len(page)
-    chunk_mapping = []
-    offset = 0
-    current_page = 0
-    for chunk in chunks:
-        if all_content.find(chunk) == -1:
-            raise ValueError(f"Chunk {chunk} not found in document {doc_id}")
-        offset += len(chunk)
-        if offset > page_mapping[current_page]:
-            current_page += 1
-        chunk_mapping.append(current_page)
-    return chunk_mapping
-
-def map_to_pages_doc_intelligence(doc_id: int, chunks: List[str]) -> List[int]:
+    df = read_content_list(make_content_path(name, folder))
+    _dump_pages(doc_id, df)
+    with open(make_markdown_path(name, folder), "r", encoding="utf-8") as f:
+        markdown = f.read()
+    starts = page_starts(markdown, df)
+    return assign_pages(np.diff(np.append(starts, len(markdown))).tolist(), chunks, offsets)
+
+def map_to_pages_doc_intelligence(doc_id: int, chunks: List[str], offsets: Optional[List[Tuple[int, int]]] = None) -> List[int]:
     full_text = "".join(chunks)
     page_break_patterns = (
         r'<!--\s*PageBreak\s*-->'                      # PageBreak (required)
@@ -85,22 +242,8 @@ def map_to_pages_doc_intelligence(doc_id: int, chunks: List[str]) -> List[int]:
 
     # Split BEFORE each pattern, keeping the pattern with the following page
     pages = re.split(f'(?={page_break_patterns})', full_text)
-    chunk_mapping = []
-    current_page_left = len(pages[0])
-    page_idx = 0
-    chunk_idx = 0
-    current_chunk_left = len(chunks[0])
-    while chunk_idx < len(chunks):
-        if current_chunk_left > current_page_left:
-            page_idx += 1
-            current_chunk_left -= current_page_left
-            current_page_left = len(pages[page_idx])
-        else:
-            chunk_idx += 1
-            chunk_mapping.append(page_idx)
-            current_page_left -= current_chunk_left
-            current_chunk_left = len(chunks[chunk_idx]) if chunk_idx < len(chunks) else 0
-    return chunk_mapping
+    # Page breaks are found in the joined chunks, so chunk positions are their cumulative lengths and offsets are not needed
+    return assign_pages([len(page) for page in pages], chunks)
 
 
 fun_map = {
@@ -108,12 +251,11 @@ fun_map = {
     "DocIntelligence": map_to_pages_doc_intelligence,
 }
 
-def map_to_pages(doc_id: int, chunks: List[str], reader: str):
-    return fun_map[reader](doc_id, chunks)
+def map_to_pages(doc_id: int, chunks: List[str], reader: str, offsets: Optional[List[Tuple[int, int]]] = None):
+    return fun_map[reader](doc_id, chunks, offsets)
 
 def chunk_to_page(chunk_idx: int, doc_id: int) -> int:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             SELECT page_idx FROM public.chunks WHERE doc_id = %s AND order_idx = %s
@@ -122,12 +264,24 @@ def chunk_to_page(chunk_idx: int, doc_id: int) -> int:
         )
         return cursor.fetchone()[0]
 
+def chunk_page_map(doc_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(order_idx, page_idx) arrays of all active chunks of a document, in one query. Unmapped chunks get page -1."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT order_idx, COALESCE(page_idx, -1) FROM public.chunks WHERE doc_id = %s AND "active?" ORDER BY order_idx
+            """,
+            (doc_id,)
+        )
+        rows = cursor.fetchall()
+    mapping = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return mapping[:, 0], mapping[:, 1]
+
 def chunks_in_page(page_idx: int, doc_id: int) -> List[int]:
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
-            SELECT id FROM public.chunks WHERE doc_id = %s AND page_idx = %s
+            SELECT order_idx FROM public.chunks WHERE doc_id = %s AND page_idx = %s AND "active?"
             """,
             (doc_id, page_idx)
         )
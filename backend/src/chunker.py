@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterator, List, Tuple
 import re
 
 class Chunker(ABC):
@@ -19,16 +19,22 @@ class SimpleChunker(Chunker):
         super().__init__()
 
     def chunk(self, text: str) -> List[str]:
-        chunks = []
+        return [chunk for chunk, _, _ in self.iter_chunks(text)]
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """Yields (chunk, start, end) with text[start:end] == chunk."""
         for i in range(0, len(text), self.stride):
-            chunks.append(text[i:i+self.chunk_size])
-        return chunks
+            yield text[i:i+self.chunk_size], i, min(i + self.chunk_size, len(text))
 
 
 import re
 from typing import List
 
 class SentenceChunker:
+    # Sentence ends never end in whitespace, so an abbreviation match is at most an abbreviation
+    # long; a run of initials "A.B.C." always also matches as the single initial "C."
+    abbreviation_window = 16
+
     def __init__(self) -> None:
         self.abbreviations = {
             'e.g.', 'i.e.', 'etc.', 'vs.', 'cf.', 'viz.', 'ex.', 'inc.',
@@ -36,65 +42,58 @@ class SentenceChunker:
             'Ltd.', 'Co.', 'Corp.', 'Inc.', 'LLC', 'U.S.', 'U.K.',
             'D.C.', 'E.U.', 'A.I.'
         }
+        # Known abbreviations, single initials and runs of initials, in one pass
         self.abbrev_pattern = re.compile(
-            r'(?:' + '|'.join(map(re.escape, self.abbreviations)) + r')\s*$'
+            r'(?:' + '|'.join(map(re.escape, self.abbreviations)) + r'|\b[A-Z]\.|\b(?:[A-Z]\.){2,})\s*$'
         )
         self.sentence_end_re = re.compile(
             r'[.!?]+(?:[\'")\]]+)?(?=(?:\s*\n*\s*[A-Z]|$))'
         )
 
     def chunk(self, text: str) -> List[str]:
-        if not text:
-            return []
+        return [text[start:end] for start, end in self.iter_sentences(text)]
 
-        sentences = []
+    def iter_sentences(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yields (start, end) offsets of consecutive sentences covering the whole text."""
         start = 0
-
         for match in self.sentence_end_re.finditer(text):
             end = match.end()
-            candidate = text[start:end]
-
-            # check if this punctuation is part of an abbreviation
-            if self._ends_with_abbreviation(candidate):
-                continue  # don't split yet
-            else:
+            # check if this punctuation is part of an abbreviation; if so don't split yet
+            if not self._ends_with_abbreviation(text, start, end):
                 # include everything up to end of punctuation
-                sentences.append(text[start:end])
+                yield start, end
                 start = end
 
-        # append the rest
+        # the rest
         if start < len(text):
-            sentences.append(text[start:])
-
-        return sentences
+            yield start, len(text)
 
-    def _ends_with_abbreviation(self, text: str) -> bool:
-        if self.abbrev_pattern.search(text):
-            return True
-        if re.search(r'\b[A-Z]\.\s*$', text):
-            return True
-        if re.search(r'\b(?:[A-Z]\.){2,}\s*$', text):
-            return True
-        return False
+    def _ends_with_abbreviation(self, text: str, start: int, end: int) -> bool:
+        # Search text[start:end] in place; characters before start are non-word, so \b behaves the same
+        return self.abbrev_pattern.search(text, max(start, end - self.abbreviation_window), end) is not None
 
 # TODO: figure out how to automatically keep one topic in one chunk.
 class LowerBoundChunker(SentenceChunker):
     def __init__(self, lower_bound: int = 1000) -> None:
         self.lower_bound = lower_bound
         super().__init__()
-    
+
     def chunk(self, text: str) -> List[str]:
-        chunks = super().chunk(text)
-        new_chunks = []
-        current_chunk = ""
-        for chunk in chunks:
-            if len(current_chunk) >= self.lower_bound:
-                new_chunks.append(current_chunk)
-                current_chunk = ""
-            current_chunk += chunk
-        if current_chunk:
-            new_chunks.append(current_chunk)
-        return new_chunks
+        return [chunk for chunk, _, _ in self.iter_chunks(text)]
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """
+        Single pass over the sentences, merging them until a chunk reaches lower_bound characters.
+        Yields (chunk, start, end) with text[start:end] == chunk; only offsets are kept in between.
+        """
+        chunk_start = chunk_end = 0
+        for start, end in self.iter_sentences(text):
+            if chunk_end - chunk_start >= self.lower_bound:
+                yield text[chunk_start:chunk_end], chunk_start, chunk_end
+                chunk_start = start
+            chunk_end = end
+        if chunk_end > chunk_start:
+            yield text[chunk_start:chunk_end], chunk_start, chunk_end
 
 
 
@@ -2,8 +2,8 @@ import psycopg2
 from fastapi import UploadFile
 from io import BytesIO
 import logging
-from .pg_connection import get_connection
-from typing import List, Dict
+from .pg_connection import connection
+from typing import List, Dict, Optional
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,59 +18,61 @@ logger = logging.getLogger(__name__)
 def insert_doc(doc: UploadFile, folder: str = None, force: bool = False) -> int:
     """
     For insterting data in doc table
-    conn: connection to db;
-    doc: fastapi uploadfile object.
+    doc: fastapi uploadfile object, or a SpooledUpload.
+    Returns -1 if the name is already taken, unless force is set. Existing documents are
+    never replaced by name; identical content is deduplicated by its hash instead.
+    The content hash is not recorded here; insert_doc_chunks sets it once the document is complete.
     """
-    conn = get_connection()
     name = doc.filename
     size = doc.size / 1048576
 
-    # Check if doc already exists
-    with conn.cursor() as cursor:
+    with connection() as conn:
+        # Check if doc already exists
         if not force:
-            cursor.execute(
-                """
-                SELECT * FROM public.docs_metadata WHERE name = %s
-                """,
-                (name)
-            )
-            result = cursor.fetchone()
-            if result:
-                logger.info(f"Doc {name} already exists")
-                return -1
-        else:
-            cursor.execute(
-                """
-                DELETE FROM public.docs_metadata WHERE name = %s
-                """,
-                (name,)
-            )
-            if cursor.rowcount > 0:
-                logger.info(f"Doc {name} deleted")
-            else:
-                logger.info(f"No document with name {name} found")
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT * FROM public.docs_metadata WHERE name = %s
+                    """,
+                    (name,)
+                )
+                result = cursor.fetchone()
+                if result:
+                    logger.info(f"Doc {name} already exists")
+                    return -1
 
-    # Otherwise insert
-    with conn.cursor() as cursor:
-        insert_sql = """
-        INSERT INTO public.docs_metadata (name, size_mb, folder)
-        VALUES (%s, %s, %s)
-        RETURNING id;
-        """
-        cursor.execute(insert_sql, (name, size, folder))
-        id = cursor.fetchone()[0]
-        conn.commit()
+        # Otherwise insert
+        with conn.cursor() as cursor:
+            insert_sql = """
+            INSERT INTO public.docs_metadata (name, size_mb, folder)
+            VALUES (%s, %s, %s)
+            RETURNING id;
+            """
+            cursor.execute(insert_sql, (name, size, folder))
+            id = cursor.fetchone()[0]
 
     return id
 
+def find_doc_by_hash(sha256: str) -> Optional[int]:
+    """Id of the completed document with this content hash, or None. Documents still being ingested have no hash."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT id FROM public.docs_metadata WHERE sha256 = %s", (sha256,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def delete_doc(doc_id: int) -> None:
+    """Remove a document's metadata and chunks, e.g. after a failed ingestion."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM public.chunks WHERE doc_id = %s", (doc_id,))
+        cursor.execute("DELETE FROM public.docs_metadata WHERE id = %s", (doc_id,))
+
 def get_all_docs() -> List[Dict]:
     """
     Return a list of document metadata with stable field names.
     Only returns the minimal fields needed by the frontend to avoid relying on
     implicit column order from SELECT *.
     """
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute("SELECT id, name FROM public.docs_metadata ORDER BY id")
         rows = cursor.fetchall()
         return [{"id": row[0], "name": row[1]} for row in rows]
@@ -79,8 +81,7 @@ def get_doc(doc_id: int) -> Dict:
     """
     Return a document metadata with stable field names.
     """
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute("SELECT id, name, folder FROM public.docs_metadata WHERE id = %s", (doc_id,))
         row = cursor.fetchone()
         return {"id": row[0], "name": row[1], "folder": row[2]}
\ No newline at end of file
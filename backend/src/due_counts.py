@@ -0,0 +1,50 @@
+import os
+from datetime import datetime, timezone
+from typing import Dict, Tuple, Optional
+from .neo4j_connection import driver
+from .lru_cache import ByteLRUCache
+
+tz = timezone.utc
+
+# Per-user (due count, time the next item becomes due); each entry counts as one unit of the budget
+due_count_cache = ByteLRUCache(int(os.getenv("DUE_COUNT_CACHE_MAX_USERS", "100000")), lambda entry: 1)
+
+
+def _load_due_count(userid: str) -> Tuple[int, Optional[datetime]]:
+    result = driver.execute_query(
+        """
+        MATCH (r:RepetitionState)
+        WHERE r.userid = $userid
+        WITH r, r.next_repeat < datetime() AS due
+        RETURN count(CASE WHEN due THEN 1 END) AS total,
+               min(CASE WHEN NOT due THEN r.next_repeat END) AS next_due
+        """,
+        userid=userid
+    )
+    record = result.records[0]
+    next_due = record["next_due"]
+    return record["total"], next_due.to_native() if next_due is not None else None
+
+
+def get_due_count(userid: str) -> int:
+    """
+    Cached number of the user's due items. An entry stays valid until the next
+    item becomes due, or until answers or tracking invalidate it.
+    """
+    key = str(userid)
+    entry = due_count_cache.get(key)
+    if entry is not None:
+        total, next_due = entry
+        if next_due is None or datetime.now(tz) < next_due:
+            return total
+    total, next_due = _load_due_count(userid)
+    due_count_cache.put(key, (total, next_due))
+    return total
+
+
+def invalidate_due_count(userid: str) -> None:
+    due_count_cache.pop(str(userid))
+
+
+def due_count_stats() -> Dict:
+    return due_count_cache.stats()
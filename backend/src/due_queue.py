@@ -0,0 +1,169 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from .neo4j_connection import driver
+
+tz = timezone.utc
+
+max_users = int(os.getenv("DUE_QUEUE_MAX_USERS", "1000"))
+idle_seconds = float(os.getenv("DUE_QUEUE_IDLE_SECONDS", "1800"))
+# Queues are reloaded after this long, picking up changes made by other processes
+refresh_seconds = float(os.getenv("DUE_QUEUE_REFRESH_SECONDS", "300"))
+
+
+class _UserQueue:
+    def __init__(self) -> None:
+        # (next_repeat, node_id, doc_id); entries whose next_repeat differs from `current` are stale
+        self.heap = []
+        self.current: Dict[str, datetime] = {}
+        self.last_access = time.monotonic()
+        self.loaded_at = self.last_access
+
+    def push(self, node_id: str, doc_id: int, next_repeat: datetime) -> None:
+        self.current[node_id] = next_repeat
+        heapq.heappush(self.heap, (next_repeat, node_id, doc_id))
+        # Compact once stale entries dominate
+        if len(self.heap) > 2 * len(self.current) + 64:
+            self.heap = [entry for entry in self.heap if self.current.get(entry[1]) == entry[0]]
+            heapq.heapify(self.heap)
+
+
+class DueQueue:
+    """
+    In-memory min-heap of (next_repeat, node_id) per active user.
+
+    Queues are loaded lazily from Neo4j on first use and kept in sync by
+    merge_repetition_states in this process. Answers handled by other processes
+    are only seen after refresh_seconds, so the queue is a hint: callers check
+    popped nodes against the graph and correct the queue with update() and remove().
+    Least recently used and idle users are evicted.
+    """
+    def __init__(self, max_users: int = max_users, idle_seconds: float = idle_seconds,
+                 refresh_seconds: float = refresh_seconds) -> None:
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.refresh_seconds = refresh_seconds
+        self._users: "OrderedDict[str, _UserQueue]" = OrderedDict()
+        # Updates that arrive while a user's queue is being loaded
+        self._loading: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self, userid: str) -> _UserQueue:
+        result = driver.execute_query(
+            """
+            MATCH (n:BookKnowledge)-[:LAST_REPEATED]->(r:RepetitionState)
+            WHERE r.userid = $userid
+            RETURN elementId(n) AS node_id, n.doc_id AS doc_id, r.next_repeat AS next_repeat
+            """,
+            userid=userid
+        )
+        queue = _UserQueue()
+        for record in result.records:
+            queue.current[record["node_id"]] = record["next_repeat"].to_native()
+            queue.heap.append((queue.current[record["node_id"]], record["node_id"], record["doc_id"]))
+        heapq.heapify(queue.heap)
+        return queue
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._users:
+            userid, queue = next(iter(self._users.items()))
+            if len(self._users) <= self.max_users and now - queue.last_access < self.idle_seconds:
+                break
+            del self._users[userid]
+            self._stats["evictions"] += 1
+
+    def _get(self, userid: str) -> _UserQueue:
+        with self._lock:
+            queue = self._users.get(userid)
+            if queue is not None and time.monotonic() - queue.loaded_at < self.refresh_seconds:
+                self._users.move_to_end(userid)
+                queue.last_access = time.monotonic()
+                self._stats["hits"] += 1
+                self._evict()
+                return queue
+            self._stats["misses"] += 1
+            self._loading.setdefault(userid, [])
+        try:
+            queue = self._load(userid)
+        except Exception:
+            with self._lock:
+                self._loading.pop(userid, None)
+            raise
+        with self._lock:
+            for update in self._loading.pop(userid, []):
+                queue.push(*update)
+            existing = self._users.get(userid)
+            if existing is not None and existing.loaded_at > queue.loaded_at:
+                return existing
+            self._users[userid] = queue
+            self._users.move_to_end(userid)
+            self._evict()
+        return queue
+
+    def update(self, userid: str, node_id: str, doc_id: int, next_repeat: datetime) -> None:
+        """Record a new next_repeat for a node. No-op for users whose queue is not loaded."""
+        userid = str(userid)
+        with self._lock:
+            queue = self._users.get(userid)
+            if queue is not None:
+                queue.push(node_id, doc_id, next_repeat)
+            if userid in self._loading:
+                # Also replayed onto the queue being (re)loaded
+                self._loading[userid].append((node_id, doc_id, next_repeat))
+
+    def remove(self, userid: str, node_id: str) -> None:
+        """Forget a node, e.g. one deleted from the graph. Its heap entries become stale."""
+        with self._lock:
+            queue = self._users.get(str(userid))
+            if queue is not None:
+                queue.current.pop(node_id, None)
+
+    def pop_due(self, userid: str, limit: int, doc_id: Optional[int] = None) -> List[str]:
+        """
+        Element ids of the user's `limit` most overdue nodes (optionally of one document).
+        Items stay queued until an answer (or update()) moves their next_repeat.
+        """
+        userid = str(userid)
+        queue = self._get(userid)
+        now = datetime.now(tz)
+        due, skipped = [], []
+        with self._lock:
+            while queue.heap and len(due) < limit and queue.heap[0][0] < now:
+                entry = heapq.heappop(queue.heap)
+                if queue.current.get(entry[1]) != entry[0]:
+                    continue  # stale
+                if doc_id is None or entry[2] == doc_id:
+                    due.append(entry)
+                else:
+                    skipped.append(entry)
+            for entry in due + skipped:
+                heapq.heappush(queue.heap, entry)
+        return [entry[1] for entry in due]
+
+    def invalidate(self, userid: Optional[str] = None) -> None:
+        with self._lock:
+            if userid is None:
+                self._users.clear()
+            else:
+                self._users.pop(str(userid), None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "users": len(self._users),
+                "entries": sum(len(queue.heap) for queue in self._users.values()),
+                "max_users": self.max_users,
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+due_queue = DueQueue()
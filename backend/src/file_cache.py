@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import BinaryIO, Dict, Hashable, Iterable, Optional, Union
+from .paths import file_cache_path
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+max_bytes = int(float(os.getenv("FILE_CACHE_MAX_MB", "1024")) * 1048576)
+
+
+class DiskFileCache:
+    """
+    Local copies of stored files, bounded by their total size with LRU eviction.
+
+    Each entry is "{key}.pdf" plus a "{key}.json" sidecar holding the size, ETag and
+    last-modified time of the stored original, so cached copies answer conditional and
+    range requests with the same validators as the storage itself. Files are written to
+    a temporary name and renamed into place; the sidecar is written last, so an entry
+    without one is never served.
+    """
+    def __init__(self, root: str = file_cache_path, max_bytes: int = max_bytes) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One fill at a time per key
+        self._fill_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._scan()
+
+    def _scan(self) -> None:
+        # Rebuild the index from disk, oldest access first
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json") or name.startswith("."):
+                continue
+            key = name[:-len(".json")]
+            try:
+                with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                    size = json.load(f)["size"]
+                entries.append((os.path.getatime(self._data_path(key)), key, size))
+            except (OSError, ValueError, KeyError):
+                continue
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._bytes += size
+
+    def _data_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.pdf")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def fill_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._fill_locks.setdefault(str(key), threading.Lock())
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[Dict]:
+        """{"path", "size", "etag", "last_modified"} of a cached file, or None. count: update hit/miss counters."""
+        key = str(key)
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if os.path.getsize(self._data_path(key)) != meta["size"]:
+                raise ValueError("size mismatch")
+        except (OSError, ValueError, KeyError):
+            if count:
+                with self._lock:
+                    self._stats["misses"] += 1
+            return None
+        with self._lock:
+            if count:
+                self._stats["hits"] += 1
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+            else:
+                # Written by another process
+                self._sizes[key] = meta["size"]
+                self._bytes += meta["size"]
+        return {
+            "path": self._data_path(key),
+            "size": meta["size"],
+            "etag": meta["etag"],
+            "last_modified": datetime.fromisoformat(meta["last_modified"]),
+        }
+
+    def put(self, key: Hashable, source: Union[str, BinaryIO, bytes, Iterable[bytes]], etag: str,
+            last_modified: datetime) -> Optional[Dict]:
+        """
+        Cache a file from a path (copied with the kernel's copy routines), a file object,
+        bytes, or an iterable of blocks. Returns the entry, or None if it exceeds the budget.
+        """
+        key = str(key)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if isinstance(source, str):
+                    out.close()
+                    shutil.copyfile(source, tmp)
+                elif isinstance(source, (bytes, bytearray)):
+                    out.write(source)
+                elif hasattr(source, "read"):
+                    shutil.copyfileobj(source, out)
+                else:
+                    for block in source:
+                        out.write(block)
+            size = os.path.getsize(tmp)
+            if size > self.max_bytes:
+                return None
+            self.delete(key)
+            os.replace(tmp, self._data_path(key))
+            meta_fd, meta_tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+            with os.fdopen(meta_fd, "w", encoding="utf-8") as f:
+                json.dump({"size": size, "etag": etag, "last_modified": last_modified.isoformat()}, f)
+            os.replace(meta_tmp, self._meta_path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        with self._lock:
+            self._sizes[key] = size
+            self._bytes += size
+            self._stats["stores"] += 1
+        self._evict()
+        return self.get(key, count=False)
+
+    def delete(self, key: Hashable) -> None:
+        key = str(key)
+        for path in (self._meta_path(key), self._data_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            size = self._sizes.pop(key, None)
+            if size is not None:
+                self._bytes -= size
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or not self._sizes:
+                    return
+                key = next(iter(self._sizes))
+                self._stats["evictions"] += 1
+            logger.info(f"Evicting cached file {key}")
+            self.delete(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._sizes), "bytes": self._bytes, "max_bytes": self.max_bytes})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+file_cache = DiskFileCache()
+
+
+def file_cache_stats() -> Dict:
+    return file_cache.stats()
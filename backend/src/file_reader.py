@@ -1,10 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Dict
 from fastapi import UploadFile
 from io import BytesIO
 import os
 import logging
 from .paths import output_path, upload_path, get_output_folder
+from .reader_cache import reader_cache, content_hash, make_reader_key
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,12 +24,34 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class FileReader(ABC):
+    name = "UndefinedReader"
+    # Output is cached on disk by content hash, reader name and settings(); None disables it
+    cache = reader_cache
+
     def __init__(self) -> None:
         pass
-        self.name = "UndefinedReader"
-    
-    @abstractmethod
+
+    def settings(self) -> Dict:
+        """Reader options that change the output."""
+        return {}
+
     def read_file(self, file: UploadFile) -> Any:
+        if self.cache is None:
+            return self._read_file(file)
+        key = make_reader_key(content_hash(file), self.name, self.settings())
+        cached = self.cache.get(key, file.filename)
+        if cached is not None:
+            logger.info(f"Reusing cached {self.name} output for {file.filename}")
+            return cached
+        contents, result_folder = self._read_file(file)
+        try:
+            self.cache.put(key, file.filename, contents, result_folder)
+        except OSError as e:
+            logger.warning(f"Failed to cache {self.name} output for {file.filename}: {e}")
+        return (contents, result_folder)
+
+    @abstractmethod
+    def _read_file(self, file: UploadFile) -> Any:
         pass
 
 # from PyPDF2 import PdfReader
@@ -45,21 +68,28 @@ class FileReader(ABC):
 #         return (contents, None)
 
 import subprocess
+import shutil
 import os
 
 class MineruReader(FileReader):
+    name = "MineruReader"
+    backend = "pipeline"
+    method = "auto"
+    lang = "en"
+
     def __init__(self) -> None:
         super().__init__()
-        self.name = "MineruReader"
 
-    def read_file(self, file: UploadFile) -> Any:
+    def settings(self) -> Dict:
+        return {"backend": self.backend, "method": self.method, "lang": self.lang}
+
+    def _read_file(self, file: UploadFile) -> Any:
         file_path = os.path.join(upload_path, file.filename)
         with open(file_path, "wb") as f:
-            f.write(file.file.read())
-        backend = "pipeline"
+            shutil.copyfileobj(file.file, f)
         final_path = os.path.join(output_path, file.filename)
         if not os.path.exists(final_path):
-            subprocess.run(["mineru", "-p", file_path, "-o", output_path, "-m", "auto", "-l", "en", "-d", "cuda", "--vram", "5", "-b", backend]) #, "-b", "vlm-transformers")
+            subprocess.run(["mineru", "-p", file_path, "-o", output_path, "-m", self.method, "-l", self.lang, "-d", "cuda", "--vram", "5", "-b", self.backend]) #, "-b", "vlm-transformers")
         else:
             logger.info(f"Found existing processed file in path: {output_path}")
         result_folder = get_output_folder(file_path)
@@ -71,14 +101,21 @@ from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
 
 class DocIntelligenceReader(FileReader):
+    name = "DocIntelligence"
+
+    model = "prebuilt-layout"
+    output_content_format = "markdown"
+
     def __init__(self) -> None:
         super().__init__()
-        self.name = "DocIntelligence"
         self.client = DocumentIntelligenceClient(endpoint, AzureKeyCredential(key))
 
-    def read_file(self, file: UploadFile) -> Any:
-        bin_content = file.file.read()
-        poller = self.client.begin_analyze_document("prebuilt-layout", bin_content, output_content_format="markdown")
+    def settings(self) -> Dict:
+        return {"model": self.model, "output_content_format": self.output_content_format}
+
+    def _read_file(self, file: UploadFile) -> Any:
+        # Pass the stream so the request body is sent without loading the whole PDF
+        poller = self.client.begin_analyze_document(self.model, file.file, output_content_format=self.output_content_format)
         result = poller.result()
         return (result.content, None)
 
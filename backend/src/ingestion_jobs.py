@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from psycopg2.errors import UniqueViolation
+from psycopg2.extras import Json
+from dotenv import load_dotenv
+from .pg_connection import connection
+from .upload_spool import SpooledUpload
+from .docs_db import insert_doc, find_doc_by_hash, delete_doc
+from .chunk_db import insert_doc_chunks, count_active_chunks
+from .chunker import DefaultChunker
+from .file_reader import DefaultReader
+from .pdf_storage import store_file, delete_file
+import logging
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+ingestion_workers = int(os.getenv("INGESTION_WORKERS", "2"))
+# A running job refreshes updated_at every lease / 3 seconds; recover() only takes over jobs silent for longer
+ingestion_lease_seconds = float(os.getenv("INGESTION_LEASE_SECONDS", "600"))
+stages = ["read", "register", "store", "chunk", "insert_chunks"]
+job_columns = ["id", "userid", "filename", "reader", "spool_path", "sha256", "size_bytes", "status", "stage",
+               "stages", "doc_id", "chunks_count", "error", "created_at", "updated_at"]
+
+
+def create_job(userid: str, upload: SpooledUpload, reader_name: str) -> int:
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO public.ingestion_jobs (userid, filename, reader, spool_path, sha256, size_bytes, stages)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING id;
+            """,
+            (str(userid), upload.filename, reader_name, upload.path, upload.sha256, upload.size,
+             Json({name: {"status": "pending"} for name in stages}))
+        )
+        return cursor.fetchone()[0]
+
+
+def get_job(job_id: int, userid: str = None) -> Optional[Dict]:
+    """Job row as a dict with a `progress` fraction, or None. Filters by owner if userid is given."""
+    user_filter = "AND userid = %s" if userid is not None else ""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(job_columns)} FROM public.ingestion_jobs WHERE id = %s {user_filter}",
+            (job_id, str(userid)) if userid is not None else (job_id,)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip(job_columns, row))
+    finished = [job["stages"].get(name, {}).get("status") for name in stages]
+    job["progress"] = sum(status in ("done", "skipped") for status in finished) / len(stages)
+    job["deduplicated"] = job["status"] == "done" and all(status == "skipped" for status in finished)
+    return job
+
+
+def _claim_job(job_id: int, job_stages: Dict) -> Optional[Dict]:
+    """Atomically move a queued job to running. None if it is not queued (claimed elsewhere or finished)."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE public.ingestion_jobs
+            SET status = 'running', stage = NULL, stages = %s, error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'queued'
+            RETURNING {', '.join(job_columns)}
+            """,
+            (Json(job_stages), job_id)
+        )
+        row = cursor.fetchone()
+    return dict(zip(job_columns, row)) if row is not None else None
+
+
+def _update_job(job_id: int, **fields) -> None:
+    fields = {key: Json(value) if isinstance(value, dict) else value for key, value in fields.items()}
+    # With no fields this only refreshes updated_at (the heartbeat)
+    assignments = ", ".join([f"{key} = %s" for key in fields] + ["updated_at = CURRENT_TIMESTAMP"])
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE public.ingestion_jobs SET {assignments} WHERE id = %s",
+            (*fields.values(), job_id)
+        )
+
+
+class IngestionJobs:
+    """
+    Bounded worker pool running document ingestion (OCR, storage, chunking, page mapping)
+    outside the request. Job state lives in public.ingestion_jobs, so unfinished jobs are
+    picked up again by recover() after a restart. Workers claim jobs atomically and keep a
+    heartbeat, so several processes can share the table.
+
+    readers: reader name -> FileReader class; store: function(doc_id, upload) persisting the PDF;
+    discard: function(doc_id) removing a stored PDF again.
+    """
+    def __init__(self, readers: Dict[str, Callable], workers: int = ingestion_workers,
+                 store: Callable = store_file, page_mapping_reader: str = DefaultReader.name,
+                 discard: Callable = delete_file) -> None:
+        self.readers = readers
+        self.store = store
+        self.discard = discard
+        self.page_mapping_reader = page_mapping_reader
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingestion")
+
+    def submit(self, userid: str, upload: SpooledUpload, reader_name: str) -> int:
+        """Queue an upload for ingestion. The job takes ownership of the spool file."""
+        if reader_name not in self.readers:
+            raise ValueError(f"Unknown reader {reader_name}")
+        try:
+            job_id = create_job(userid, upload, reader_name)
+        except Exception:
+            upload.close()
+            raise
+        self.executor.submit(self.run, job_id)
+        logger.info(f"Queued ingestion job {job_id} for {upload.filename}")
+        return job_id
+
+    def recover(self) -> int:
+        """
+        Requeue jobs whose worker died (running, with no heartbeat for a lease) and schedule all
+        queued jobs. Safe with several processes: a job only runs where its claim succeeds.
+        Returns how many jobs were scheduled.
+        """
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE public.ingestion_jobs SET status = 'queued', stage = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """,
+                (ingestion_lease_seconds,)
+            )
+            cursor.execute("SELECT id FROM public.ingestion_jobs WHERE status = 'queued' ORDER BY id")
+            job_ids = [row[0] for row in cursor.fetchall()]
+        for job_id in job_ids:
+            self.executor.submit(self.run, job_id)
+        if job_ids:
+            logger.info(f"Recovered {len(job_ids)} ingestion jobs")
+        return len(job_ids)
+
+    @contextmanager
+    def _heartbeat(self, job_id: int):
+        # Keeps the lease of a running job alive through long stages such as OCR
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(ingestion_lease_seconds / 3):
+                try:
+                    _update_job(job_id)
+                except Exception as e:
+                    logger.warning(f"Heartbeat for ingestion job {job_id} failed: {e}")
+
+        thread = threading.Thread(target=beat, name=f"ingestion-heartbeat-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    @contextmanager
+    def _stage(self, job_id: int, job_stages: Dict, name: str):
+        started = time.monotonic()
+        job_stages[name] = {"status": "running"}
+        _update_job(job_id, stage=name, stages=job_stages)
+        try:
+            yield
+        except Exception:
+            job_stages[name] = {"status": "failed", "seconds": round(time.monotonic() - started, 3)}
+            raise
+        job_stages[name] = {"status": "done", "seconds": round(time.monotonic() - started, 3)}
+        _update_job(job_id, stages=job_stages)
+
+    def _attach(self, job_id: int, job_stages: Dict, doc_id: int) -> None:
+        for name, stage in job_stages.items():
+            if stage["status"] == "pending":
+                job_stages[name] = {"status": "skipped"}
+        _update_job(job_id, status="done", stage=None, stages=job_stages, doc_id=doc_id,
+                    chunks_count=count_active_chunks(doc_id))
+        logger.info(f"Ingestion job {job_id} reused doc {doc_id} with the same content")
+
+    def run(self, job_id: int) -> None:
+        job_stages = {name: {"status": "pending"} for name in stages}
+        job = _claim_job(job_id, job_stages)
+        if job is None:
+            return
+        upload = SpooledUpload(job["filename"], job["spool_path"], job["size_bytes"], job["sha256"])
+        with self._heartbeat(job_id):
+            self._run_claimed(job_id, job, job_stages, upload)
+
+    def _discard(self, job_id: int, doc_id: int) -> None:
+        # Remove a document whose ingestion did not complete, so nothing attaches to it
+        try:
+            self.discard(doc_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete stored file of doc {doc_id}: {e}")
+        try:
+            delete_doc(doc_id)
+            _update_job(job_id, doc_id=None)
+        except Exception as e:
+            logger.error(f"Failed to delete half-registered doc {doc_id} of ingestion job {job_id}: {e}")
+
+    def _run_claimed(self, job_id: int, job: Dict, job_stages: Dict, upload: SpooledUpload) -> None:
+        doc_id = None
+        try:
+            if not os.path.exists(upload.path):
+                raise FileNotFoundError(f"Spool file {upload.path} is missing")
+            # Identical bytes were ingested before: reuse that document's chunks and knowledge graph
+            existing = find_doc_by_hash(upload.sha256)
+            if existing is not None:
+                self._attach(job_id, job_stages, existing)
+                return
+            if job["doc_id"] is not None:
+                # Left over by a previous attempt that died before completing the document
+                self._discard(job_id, job["doc_id"])
+            with self._stage(job_id, job_stages, "read"):
+                content, result_folder = self.readers[job["reader"]]().read_file(upload)
+            with self._stage(job_id, job_stages, "register"):
+                # Never replaces documents by name; identical content was deduplicated by hash above
+                doc_id = insert_doc(upload, result_folder, force=True)
+                _update_job(job_id, doc_id=doc_id)
+            with self._stage(job_id, job_stages, "store"):
+                upload.rewind()
+                self.store(doc_id, upload)
+            with self._stage(job_id, job_stages, "chunk"):
+                chunks, offsets = [], []
+                for chunk, start, end in DefaultChunker().iter_chunks(content):
+                    chunks.append(chunk)
+                    offsets.append((start, end))
+            try:
+                with self._stage(job_id, job_stages, "insert_chunks"):
+                    # Records the content hash with the chunks, which completes the document
+                    insert_doc_chunks(chunks, doc_id, self.page_mapping_reader, offsets, sha256=upload.sha256)
+            except UniqueViolation:
+                # A concurrent job completed the same content first
+                existing = find_doc_by_hash(upload.sha256)
+                if existing is None:
+                    raise
+                self._discard(job_id, doc_id)
+                doc_id = None
+                self._attach(job_id, job_stages, existing)
+                return
+            completed, doc_id = doc_id, None
+            _update_job(job_id, status="done", stage=None, chunks_count=len(chunks))
+            logger.info(f"Ingestion job {job_id} done: doc {completed}, {len(chunks)} chunks")
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            if doc_id is not None:
+                self._discard(job_id, doc_id)
+            _update_job(job_id, status="failed", stages=job_stages, error=str(e))
+        finally:
+            upload.close()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+from typing import Optional, Dict
+from dotenv import load_dotenv
+from .pg_connection import connection
+import logging
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached responses kept in public.llm_cache before least recently used rows are evicted
+max_cache_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1048576)
+# Eviction needs a full scan of the table, so only run it every N stores
+evict_every = 100
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += value
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model: str, template: str, text: str) -> str:
+    """
+    Content-addressed key of an LLM call: (model, prompt template hash, input text).
+    """
+    digest = hashlib.sha256()
+    for part in (model or "", template_hash(template), text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def get_cached_response(model: str, template: str, text: str) -> Optional[str]:
+    """
+    Return the cached response for the call or None. Cache failures count as misses.
+    """
+    key = make_cache_key(model, template, text)
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE public.llm_cache SET last_used_at = CURRENT_TIMESTAMP
+                WHERE key = %s
+                RETURNING response
+                """,
+                (key,)
+            )
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        _count("errors")
+        row = None
+    if row is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return row[0]
+
+
+def set_cached_response(model: str, template: str, text: str, response: str) -> None:
+    """
+    Store a (valid) LLM response. Evicts least recently used rows once the cache exceeds LLM_CACHE_MAX_MB.
+    """
+    key = make_cache_key(model, template, text)
+    try:
+        with connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO public.llm_cache (key, model, prompt_hash, response, size_bytes)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (key) DO UPDATE
+                SET response = EXCLUDED.response, size_bytes = EXCLUDED.size_bytes, last_used_at = CURRENT_TIMESTAMP
+                """,
+                (key, model, template_hash(template), response, len(response.encode("utf-8")))
+            )
+            with _stats_lock:
+                _stats["stores"] += 1
+                evict = _stats["stores"] % evict_every == 0
+            if evict:
+                _count("evictions", _evict(cursor))
+    except Exception as e:
+        logger.warning(f"LLM cache store failed: {e}")
+        _count("errors")
+
+
+def _evict(cursor) -> int:
+    cursor.execute(
+        """
+        DELETE FROM public.llm_cache WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(size_bytes) OVER (ORDER BY last_used_at DESC, key) AS running
+                FROM public.llm_cache
+            ) ranked
+            WHERE running > %s
+        )
+        """,
+        (max_cache_bytes,)
+    )
+    if cursor.rowcount > 0:
+        logger.info(f"Evicted {cursor.rowcount} LLM cache entries")
+    return max(cursor.rowcount, 0)
+
+
+def llm_cache_stats() -> Dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ByteLRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by the total size of its values.
+
+    size_of: function returning the size in bytes of a value.
+    """
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int]) -> None:
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self._stats["hits"] += 1
+            return self._items[key]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Like get, but without touching recency or hit/miss counters."""
+        with self._lock:
+            return self._items.get(key)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._sizes.pop(key)
+                del self._items[key]
+            self._items[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, _ = self._items.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self._stats["evictions"] += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove and return an entry (None if absent)."""
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._bytes -= self._sizes.pop(key)
+            self._stats["invalidations"] += 1
+            return self._items.pop(key)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate. Returns the number dropped."""
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+                self._bytes -= self._sizes.pop(key)
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
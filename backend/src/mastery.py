@@ -0,0 +1,167 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .neo4j_connection import driver
+from .chunk_maper import chunk_page_map
+from .lru_cache import ByteLRUCache
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Per (userid, doc_id) mastery state: summed object states and object counts per chunk plus chunk -> page map
+mastery_cache = ByteLRUCache(
+    int(float(os.getenv("MASTERY_CACHE_MAX_MB", "32")) * 1048576),
+    lambda entry: sum(array.nbytes for array in entry.values())
+)
+# Serializes in-place updates of cached arrays, and cache fills against updates
+_update_lock = threading.Lock()
+
+
+class _Load:
+    # One in-flight _load; marked stale when an update or invalidation of its key arrives meanwhile
+    def __init__(self) -> None:
+        self.stale = False
+
+
+_loads: Dict[Tuple[str, int], List[_Load]] = {}
+
+
+def _object_ranges(userid: str, doc_id: int):
+    result = driver.execute_query(
+        """
+        MATCH (n:BookKnowledge)-[:LAST_REPEATED]->(r:RepetitionState)
+        WHERE r.userid = $userid AND n.doc_id = $doc_id
+        RETURN n.chunk_id_s AS s, n.chunk_id_e AS e, r.state AS state
+        """,
+        userid=userid, doc_id=doc_id
+    )
+    records = result.records
+    starts = np.fromiter((record["s"] for record in records), dtype=np.int64, count=len(records))
+    ends = np.fromiter((record["e"] for record in records), dtype=np.int64, count=len(records))
+    states = np.fromiter((int(record["state"]) for record in records), dtype=float, count=len(records))
+    return starts, ends, states
+
+
+def _range_sums(starts: np.ndarray, ends: np.ndarray, values: np.ndarray, length: int) -> np.ndarray:
+    """Sum of values over all [start, end] ranges covering each index, via a difference array."""
+    diff = np.zeros(length + 1, dtype=float)
+    np.add.at(diff, starts, values)
+    np.add.at(diff, ends + 1, -values)
+    return np.cumsum(diff[:-1])
+
+
+def _load(userid: str, doc_id: int) -> Dict[str, np.ndarray]:
+    order_idx, page_idx = chunk_page_map(doc_id)
+    n_chunks = int(order_idx.max()) + 1 if len(order_idx) else 0
+    # Chunks without a page keep -1
+    pages = np.full(n_chunks, -1, dtype=np.int64)
+    pages[order_idx] = page_idx
+
+    starts, ends, states = _object_ranges(userid, doc_id)
+    # Objects referencing chunks past the current chunking are clipped
+    keep = starts < n_chunks
+    starts, ends, states = starts[keep], np.minimum(ends[keep], n_chunks - 1), states[keep]
+    return {
+        "sums": _range_sums(starts, ends, states, n_chunks),
+        "counts": _range_sums(starts, ends, np.ones_like(states), n_chunks),
+        "pages": pages,
+    }
+
+
+def _get_entry(userid: str, doc_id: int) -> Dict[str, np.ndarray]:
+    key = (str(userid), doc_id)
+    entry = mastery_cache.get(key)
+    if entry is None:
+        load = _Load()
+        with _update_lock:
+            _loads.setdefault(key, []).append(load)
+        try:
+            entry = _load(userid, doc_id)
+        finally:
+            with _update_lock:
+                _loads[key] = [other for other in _loads[key] if other is not load]
+                if not _loads[key]:
+                    del _loads[key]
+                # A snapshot read before a concurrent answer is served once but never cached
+                if not load.stale:
+                    mastery_cache.put(key, entry)
+    return entry
+
+
+def get_chunk_mastery(userid: str, doc_id: int) -> List[float]:
+    """Mean repetition state of the user's objects covering each chunk (0 for uncovered chunks)."""
+    entry = _get_entry(userid, doc_id)
+    with _update_lock:
+        sums, counts = entry["sums"].copy(), entry["counts"].copy()
+    return np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0).tolist()
+
+
+# Only works for pdf documents
+def get_page_mastery(userid: str, doc_id: int) -> List[float]:
+    """Mean chunk mastery per page, normalized by the best page."""
+    entry = _get_entry(userid, doc_id)
+    with _update_lock:
+        sums, counts = entry["sums"].copy(), entry["counts"].copy()
+    pages = entry["pages"]
+    logger.info("Computing page mastery: userid=%s doc_id=%s chunk_count=%s", userid, doc_id, len(pages))
+    if len(pages) == 0:
+        return []
+    if (pages < 0).any():
+        missing = int(np.flatnonzero(pages < 0)[0])
+        logger.error("No page mapping found: doc_id=%s chunk_idx=%s", doc_id, missing)
+        raise ValueError(f"No page mapping for chunk_idx={missing} doc_id={doc_id}")
+
+    chunk_mastery = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    chunks_per_page = np.bincount(pages)
+    page_mastery = np.bincount(pages, weights=chunk_mastery)
+    page_mastery = np.divide(page_mastery, chunks_per_page, out=np.zeros_like(page_mastery), where=chunks_per_page > 0)
+
+    # Normalize only if max > 0 to avoid NaN (JSON-incompatible)
+    max_val = page_mastery.max()
+    if max_val > 0:
+        page_mastery = page_mastery / max_val
+    # else: keep as zeros
+    return page_mastery.tolist()
+
+
+def update_mastery(userid: str, doc_id: int, chunk_id_s: int, chunk_id_e: int, old_state: int, new_state: int) -> None:
+    """Apply one object's state change to the cached entry, if any, and keep in-flight loads out of the cache."""
+    if old_state == new_state:
+        return
+    key = (str(userid), doc_id)
+    with _update_lock:
+        for load in _loads.get(key, []):
+            load.stale = True
+        entry = mastery_cache.peek(key)
+        if entry is None:
+            return
+        end = min(chunk_id_e, len(entry["sums"]) - 1)
+        if chunk_id_s <= end:
+            entry["sums"][chunk_id_s:end + 1] += new_state - old_state
+
+
+def invalidate_mastery(doc_id: int, userid: Optional[str] = None) -> int:
+    """Drop cached mastery of a document, for one user or all users."""
+    if userid is None:
+        matches = lambda key: key[1] == doc_id
+    else:
+        matches = lambda key: key == (str(userid), doc_id)
+    with _update_lock:
+        for key, loads in _loads.items():
+            if matches(key):
+                for load in loads:
+                    load.stale = True
+        return mastery_cache.invalidate(matches)
+
+
+def mastery_cache_stats() -> Dict:
+    return mastery_cache.stats()
@@ -5,10 +5,23 @@ import os
 from .repetition import RepeatState
 from datetime import timezone, datetime
 from .neo4j_connection import driver
+from .due_queue import due_queue
 from random import choice
-from .chunk_db import get_max_chunk_order
+from collections import Counter
+
+import logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
 
 tz = timezone.utc
+neo4j_batch_size = int(os.getenv("NEO4J_BATCH_SIZE", "1000"))
 
 
 def add_relation(node1_id: str, node2_id: str):
@@ -53,13 +66,57 @@ def add_knowledge_object(name: str, label: str, doc_id: int, chunk_id_s: int, ch
     )
     return summary.records[0]["n"]
 
+def _create_knowledge_batches(tx, rows: list, batch_size: int):
+    nodes = []
+    for start in range(0, len(rows), batch_size):
+        result = tx.run(
+            """
+            UNWIND $rows AS row
+            CREATE (n:BookKnowledge {type: row.type, name: row.name, doc_id: row.doc_id, chunk_id_s: row.chunk_id_s, chunk_id_e: row.chunk_id_e})
+            RETURN row.idx AS idx, n
+            """,
+            rows=rows[start:start + batch_size]
+        )
+        batch = sorted(((record["idx"], record["n"]) for record in result), key=lambda pair: pair[0])
+        nodes.extend(node for _, node in batch)
+    return nodes
+
+def add_knowledge_objects(objects: list, batch_size: int = None):
+    """
+    Add many knowledge objects to the NEO4j graph in a single transaction.
+
+    Args:
+        objects: List of dicts with keys name, label, doc_id, chunk_id_s, chunk_id_e
+        batch_size: Number of objects sent per UNWIND query (defaults to NEO4J_BATCH_SIZE)
+
+    Returns:
+        The created nodes, in input order
+    """
+    batch_size = batch_size or neo4j_batch_size
+    rows = []
+    for idx, obj in enumerate(objects):
+        assert obj["chunk_id_e"] >= obj["chunk_id_s"]
+        assert obj["label"] is not None and obj["label"].strip() != ""
+        rows.append({
+            "idx": idx,
+            "type": obj["label"],
+            "name": obj["name"],
+            "doc_id": obj["doc_id"],
+            "chunk_id_s": obj["chunk_id_s"],
+            "chunk_id_e": obj["chunk_id_e"]
+        })
+    if not rows:
+        return []
+    with driver.session() as session:
+        return session.execute_write(_create_knowledge_batches, rows, batch_size)
+
 def add_review_question(node_id: str, question: str, question_type: str, cognitive_focus: str, answer: str):
     """
     Create a ReviewQuestion and link it to an existing BookKnowledge node.
     Fails cleanly if the BookKnowledge node doesn't exist.
     """
     query = """
-    MATCH (m)
+    MATCH (m:BookKnowledge)
     WHERE elementId(m) = $node_id
     CREATE (n:ReviewQuestion {type: $type, question: $question, answer: $answer, cognitive_focus: $cognitive_focus, asked: $asked, correct: $correct, asked_at: $asked_at})
     CREATE (n)-[:QUESTION_FOR]->(m)
@@ -82,50 +139,86 @@ def add_review_question(node_id: str, question: str, question_type: str, cogniti
     return records[0]["n"]
 
 
+schema_queries = [
+    # Unique constraint on userid (also backs User(userid) lookups with an index)
+    "CREATE CONSTRAINT userid_constraint IF NOT EXISTS FOR (n:User) REQUIRE n.userid IS UNIQUE",
+    "CREATE INDEX book_knowledge_doc_chunk IF NOT EXISTS FOR (n:BookKnowledge) ON (n.doc_id, n.chunk_id_e)",
+    "CREATE INDEX repetition_state_user_next IF NOT EXISTS FOR (r:RepetitionState) ON (r.userid, r.next_repeat)",
+]
+
 def init_graph():
-    # Make constraint on userid
-    try:
-        driver.execute_query(
-            "CREATE CONSTRAINT userid_constraint FOR (n:User) REQUIRE n.userid IS UNIQUE"
-        )
-    except:
-        pass
+    for query in schema_queries:
+        try:
+            driver.execute_query(query)
+        except Exception as e:
+            logger.warning(f"Schema query failed: {query}: {e}")
     
 
 # TODO: test this
-def merge_repetition_state(connected_to_id: str, state: RepeatState):
-    state_val = state.state
-    userid = state.userid
-    next_repeat = state.get_next_repeat()
+def merge_repetition_states(states: list):
+    """
+    Upsert many repetition states and their User links in one round trip.
+
+    Args:
+        states: List of (knowledge node element id, RepeatState) pairs
+
+    Returns:
+        List of (RepetitionState node, LAST_REPEATED relationship) in input order.
+        Pairs whose knowledge node does not exist are skipped.
+    """
+    if not states:
+        return []
+    rows = [
+        {
+            "idx": idx,
+            "n_id": connected_to_id,
+            "userid": state.userid,
+            "state": state.state,
+            "next_repeat": state.get_next_repeat()
+        }
+        for idx, (connected_to_id, state) in enumerate(states)
+    ]
     result = driver.execute_query(
         """
-        MATCH (n)
-        WHERE elementId(n) = $n_id
-        MERGE (n)-[c:LAST_REPEATED]->(r:RepetitionState {userid: $userid})
+        UNWIND $rows AS row
+        MATCH (n:BookKnowledge)
+        WHERE elementId(n) = row.n_id
+        MERGE (n)-[c:LAST_REPEATED]->(r:RepetitionState {userid: row.userid})
         ON CREATE SET r.last_repeated = datetime({year: 1, month: 1, day: 1, hour: 0, minute: 0, second: 0, millisecond: 0, microsecond: 0, nanosecond: 0, timezone: 'UTC'})
         ON MATCH SET r.last_repeated = datetime()
-        SET r.next_repeat = $next_repeat
-        SET r.state = $state
-        RETURN r, c
-        """,
-        n_id=connected_to_id, next_repeat=next_repeat, userid=userid, state=state_val
-    )
-    driver.execute_query(
-        """
-        MATCH (R)
-        WHERE elementId(R) = $r_id
-        MERGE (U:User {userid: $userid})
-        MERGE (R)-[:of]->(U)
+        SET r.next_repeat = row.next_repeat
+        SET r.state = row.state
+        MERGE (U:User {userid: row.userid})
+        MERGE (r)-[:of]->(U)
+        RETURN row.idx AS idx, n.doc_id AS doc_id, r, c
         """,
-        r_id=result.records[0]["r"].element_id, userid=userid
+        rows=rows
     )
-    return result.records[0]["r"], result.records[0]["c"]
+    records = sorted(result.records, key=lambda record: record["idx"])
+    for record in records:
+        row = rows[record["idx"]]
+        due_queue.update(row["userid"], row["n_id"], record["doc_id"], row["next_repeat"])
+    return [(record["r"], record["c"]) for record in records]
+
+def merge_repetition_state(connected_to_id: str, state: RepeatState):
+    return merge_repetition_states([(connected_to_id, state)])[0]
+
+def _repetition_filters(userid: str = None, doc_id: int = None, due_only: bool = False) -> str:
+    # Only add predicates that are set so the planner can use the RepetitionState/BookKnowledge indexes
+    conditions = []
+    if userid is not None:
+        conditions.append("r.userid = $userid")
+    if due_only:
+        conditions.append("r.next_repeat < datetime()")
+    if doc_id is not None:
+        conditions.append("n.doc_id = $doc_id")
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
 
 def get_all_assigned(userid: str = None, doc_id: int = None):
     result = driver.execute_query(
-        """
-        MATCH (n)-[c:LAST_REPEATED]->(r:RepetitionState)
-        WHERE (r.userid = $userid OR $userid IS NULL) AND (n.doc_id = $doc_id OR $doc_id IS NULL)
+        f"""
+        MATCH (n:BookKnowledge)-[c:LAST_REPEATED]->(r:RepetitionState)
+        {_repetition_filters(userid, doc_id)}
         RETURN n, c, r
         """,
         userid=userid, doc_id=doc_id
@@ -134,37 +227,85 @@ def get_all_assigned(userid: str = None, doc_id: int = None):
 
 def get_all_pending(userid: str = None, doc_id: int = None):
     result = driver.execute_query(
-        """
-        MATCH (n)-[c:LAST_REPEATED]->(r:RepetitionState)
-        WHERE r.next_repeat < datetime() AND (r.userid = $userid OR $userid IS NULL) AND (n.doc_id = $doc_id OR $doc_id IS NULL)
+        f"""
+        MATCH (n:BookKnowledge)-[c:LAST_REPEATED]->(r:RepetitionState)
+        {_repetition_filters(userid, doc_id, due_only=True)}
         RETURN n, c, r
         """,
         userid=userid, doc_id=doc_id
     )
     return result.records
 
-def get_objects(chunk_id: int, doc_id: int):
+def get_quiz_candidates(userid: str, doc_id: int = None, limit: int = 5, due_only: bool = True, node_ids: list = None):
+    """
+    Sample up to `limit` of the user's repetition records together with their
+    question type counts and one random existing question, in a single query.
+    If node_ids is given, those nodes are fetched (in that order) instead of sampling.
+
+    Returns a list of dicts with keys n, r, type_counts and question (None if the node has no questions).
+    """
+    if node_ids is not None:
+        selection = """
+        UNWIND range(0, size($node_ids) - 1) AS position
+        MATCH (n:BookKnowledge)-[c:LAST_REPEATED]->(r:RepetitionState)
+        WHERE elementId(n) = $node_ids[position] AND r.userid = $userid
+        WITH n, r, position
+        """
+    else:
+        selection = f"""
+        MATCH (n:BookKnowledge)-[c:LAST_REPEATED]->(r:RepetitionState)
+        {_repetition_filters(userid, doc_id, due_only)}
+        WITH n, r, 0 AS position ORDER BY rand() LIMIT $limit
+        """
+    result = driver.execute_query(
+        f"""
+        {selection}
+        OPTIONAL MATCH (q:ReviewQuestion)-[:QUESTION_FOR]->(n)
+        WITH n, r, position, collect(q) AS questions
+        ORDER BY position
+        RETURN n, r,
+               [q IN questions | q.type] AS question_types,
+               CASE WHEN size(questions) = 0 THEN null ELSE questions[toInteger(rand() * size(questions))] END AS question
+        """,
+        userid=userid, doc_id=doc_id, limit=limit, node_ids=node_ids
+    )
+    return [
+        {
+            "n": record["n"],
+            "r": record["r"],
+            "type_counts": dict(Counter(record["question_types"])),
+            "question": record["question"]
+        }
+        for record in result.records
+    ]
+
+def get_objects(chunk_id: int, doc_id: int, after_chunk_id: int = None):
+    # Lower bound is optional so the (doc_id, chunk_id_e) index serves both full and incremental lookups
+    lower_bound = "AND n.chunk_id_e > $after_chunk_id" if after_chunk_id is not None else ""
+    result = driver.execute_query(
+        f"""
+        MATCH (n:BookKnowledge)
+        WHERE n.doc_id = $doc_id AND n.chunk_id_e <= $chunk_id {lower_bound}
+        RETURN n
+        """,
+        chunk_id=chunk_id, doc_id=doc_id, after_chunk_id=after_chunk_id
+    )
+    return [record['n'] for record in result.records]
+
+def get_review_questions(node_id: str):
     result = driver.execute_query(
         """
-        MATCH (n)
-        WHERE n.chunk_id_e <= $chunk_id AND n.doc_id = $doc_id
+        MATCH (n:ReviewQuestion)-[:QUESTION_FOR]->(m:BookKnowledge)
+        WHERE elementId(m) = $node_id
         RETURN n
         """,
-        chunk_id=chunk_id, doc_id=doc_id
+        node_id=node_id
     )
     return [record['n'] for record in result.records]
 
 def get_rand_review_question(node_id: str, question_nodes: list = None):
     if question_nodes is None:
-        result = driver.execute_query(
-            """
-            MATCH (n:ReviewQuestion)-[:QUESTION_FOR]->(m)
-            WHERE elementId(m) = $node_id
-            RETURN n
-            """,
-            node_id=node_id
-        )
-        question_nodes = [record['n'] for record in result.records]
+        question_nodes = get_review_questions(node_id)
     return choice(question_nodes)
 
 import numpy as np
@@ -174,82 +315,3 @@ def interpolate(array: list):
     nans = np.isnan(array)
     array[nans] = np.interp(x[nans], x[~nans], array[~nans])
     return array.tolist()
-
-def get_chunk_mastery(userid: str, doc_id: int):
-    result = driver.execute_query(
-        """
-        MATCH (n)-[:LAST_REPEATED]->(r:RepetitionState)
-        WHERE r.userid = $userid AND n.doc_id = $doc_id
-        ORDER BY n.chunk_id_s ASC
-        RETURN r, n
-        """,
-        userid=userid, doc_id=doc_id
-    )
-
-    chunk_index_mastery_list = [[] for _ in range(get_max_chunk_order(doc_id) + 1)]
-    for record in result.records:
-        r = record["r"]
-        n = record["n"]
-        state = int(r.get("state"))
-        for chunk_idx in range(n.get("chunk_id_s"), n.get("chunk_id_e") + 1):
-            chunk_index_mastery_list[chunk_idx].append(state)
-    chunk_index_mastery = []
-    for chunk_idx_mastery in chunk_index_mastery_list:
-        val = np.mean(chunk_idx_mastery) if chunk_idx_mastery else 0.0
-        chunk_index_mastery.append(val)
-    return chunk_index_mastery
-
-from .chunk_maper import chunk_to_page
-# Only works for pdf documents
-import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # This makes it show in terminal
-    ]
-)
-
-logger = logging.getLogger(__name__)
-def get_page_mastery(userid: str, doc_id: int):
-    chunk_mastery = get_chunk_mastery(userid, doc_id)
-    page_mastery = []
-    current_page = 0
-    total_mastery = 0
-    total_chunks = 0
-    logger.info("Computing page mastery: userid=%s doc_id=%s chunk_count=%s", userid, doc_id, len(chunk_mastery))
-    for chunk_idx, mastery in enumerate(chunk_mastery):
-        total_mastery += mastery
-        total_chunks += 1
-        try:
-            mapped_page = chunk_to_page(chunk_idx, doc_id)
-        except Exception as e:
-            logger.error(
-                "chunk_to_page failed: doc_id=%s chunk_idx=%s current_page=%s total_chunks_in_page=%s error=%s",
-                doc_id, chunk_idx, current_page, total_chunks, repr(e), exc_info=True
-            )
-            raise
-        if mapped_page is None:
-            logger.error(
-                "chunk_to_page returned None: doc_id=%s chunk_idx=%s (no page mapping found)",
-                doc_id, chunk_idx
-            )
-            raise ValueError(f"No page mapping for chunk_idx={chunk_idx} doc_id={doc_id}")
-        if mapped_page > current_page:
-            page_mastery.append(total_mastery / total_chunks)
-            current_page += 1
-            total_mastery = 0
-            total_chunks = 0
-    if total_chunks > 0:
-        page_mastery.append(total_mastery / total_chunks)
-
-    # Normalize only if max > 0 to avoid NaN (JSON-incompatible)
-    if not page_mastery:
-        return []
-
-    page_mastery = np.array(page_mastery, dtype=float)
-    max_val = page_mastery.max()
-    if max_val > 0:
-        page_mastery = page_mastery / max_val
-    # else: keep as zeros
-    return page_mastery.tolist()
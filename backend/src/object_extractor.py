@@ -3,10 +3,16 @@ from dotenv import load_dotenv
 import os
 from typing import List, Dict, Any, Optional, Tuple
 import json
-from .neo4j_graph import add_knowledge_object
+import random
+import time
+import openai
+from .neo4j_graph import add_knowledge_objects
 from .repetition import RepeatState
 from .neo4j_graph import merge_repetition_state
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .llm_cache import get_cached_response, set_cached_response
+from .user_db import reset_reading_progress
 
 load_dotenv()
 
@@ -24,6 +30,12 @@ logger = logging.getLogger(__name__)
 model_name = os.getenv("MODEL_NAME")
 client = AzureOpenAI()
 completion_tokens = 10000
+extraction_concurrency = int(os.getenv("EXTRACTION_CONCURRENCY", "8"))
+# Rate limits, timeouts, dropped connections and 5xx responses are retried with exponential backoff
+extraction_api_retries = int(os.getenv("EXTRACTION_API_RETRIES", "4"))
+extraction_backoff_seconds = float(os.getenv("EXTRACTION_BACKOFF_SECONDS", "2"))
+transient_errors = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+system_prompt = "You are an expert mathematician. Analyze mathematical text and identify definitions, theorems, and properties. Always respond with valid JSON."
 price_mapping = {
     "gpt-5-nano": (0.05 / 1000000, 0.40 / 1000000),
     "gpt-4.1-mini": (0.2 / 1000000, 0.80 / 1000000),
@@ -88,81 +100,130 @@ prompts = {
         """
 }
 
-def extract_objects_from_chunks(chunks: List[Tuple[str, int]], doc_id: int, prompt_key: str = "general_textbook_prompt", max_retries: int = 3) -> List[Dict[str, Any]]:
+def _create_completion(messages: List[Dict[str, str]]):
+    for attempt in range(extraction_api_retries + 1):
+        try:
+            return client.chat.completions.create(
+                messages=messages,
+                max_completion_tokens=completion_tokens,
+                model=model_name
+            )
+        except transient_errors as e:
+            if attempt == extraction_api_retries:
+                raise
+            delay = extraction_backoff_seconds * 2 ** attempt * (1 + random.random())
+            logger.warning(f"LLM request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _extract_chunk_objects(current_chunk: str, chunk_idx: int, doc_id: int, prompt_key: str, max_retries: int) -> List[Dict[str, Any]]:
+    """
+    Extract objects from a single chunk, retrying the LLM call on invalid JSON.
+
+    Returns an empty list if no attempt gives valid JSON. API errors that persist
+    through the retries are raised.
+    """
+    object_detection_prompt = prompts[prompt_key].format(current_chunk=current_chunk)
+    cache_template = system_prompt + prompts[prompt_key]
+    detection_result = None
+
+    cached = get_cached_response(model_name, cache_template, current_chunk)
+    if cached is not None:
+        detection_result = json.loads(cached)
+
+    for _ in range(max_retries + 1 if detection_result is None else 0):
+        response = _create_completion([
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": object_detection_prompt
+            }
+        ])
+
+        content = response.choices[0].message.content
+        try:
+            detection_result = json.loads(content)
+            set_cached_response(model_name, cache_template, current_chunk, content)
+            break
+        except json.JSONDecodeError:
+            continue
+
+    if detection_result is None:
+        logger.warning(f"Skipping chunk {chunk_idx} of doc {doc_id}: no valid JSON after {max_retries + 1} attempts")
+        return []
+
+    extracted_objects = []
+    # Process all objects found in this chunk
+    objects = detection_result.get("objects", [])
+    for obj in objects:
+        object_type = obj.get("object_type")
+        object_name = obj.get("object_name")
+
+        if object_type and object_name:
+            # Create the extracted object
+            extracted_object = {
+                "name": object_name,
+                "type": object_type,
+                "doc_id": doc_id,
+                "chunk_id_s": chunk_idx,
+                "chunk_id_e": chunk_idx
+            }
+            extracted_objects.append(extracted_object)
+    return extracted_objects
+
+def extract_objects_from_chunks(chunks: List[Tuple[str, int]], doc_id: int, prompt_key: str = "general_textbook_prompt", max_retries: int = 3, max_concurrency: int = None) -> List[Dict[str, Any]]:
     """
     Process chunks to extract definitions, theorems, and properties using OpenAI.
     
     Args:
         chunks: List of tuples (text chunk, chunk idx)
         doc_id: Document ID for tracking
+        prompt_key: Key of the prompt in `prompts`
+        max_retries: Retries per chunk when the response is not valid JSON
+        max_concurrency: Maximum number of LLM requests in flight (defaults to EXTRACTION_CONCURRENCY)
     
     Returns:
-        List of extracted objects with their metadata
+        List of extracted objects with their metadata, in chunk order
+
+    Raises:
+        The first API error that persists through the retries; nothing is returned for a partial document
     """
-    extracted_objects = []
-    
-    pbar = tqdm(total=len(chunks))
-    current_retries = 0
-    
-    for i, (current_chunk, chunk_idx) in enumerate(chunks):
-        object_detection_prompt = prompts[prompt_key].format(current_chunk=current_chunk)
-
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert mathematician. Analyze mathematical text and identify definitions, theorems, and properties. Always respond with valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": object_detection_prompt
-                }
-            ],
-            max_completion_tokens=completion_tokens,
-            model=model_name
-        )
+    max_concurrency = max_concurrency or extraction_concurrency
+    results: List[List[Dict[str, Any]]] = [[] for _ in chunks]
 
+    pbar = tqdm(total=len(chunks))
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = {
+            executor.submit(_extract_chunk_objects, current_chunk, chunk_idx, doc_id, prompt_key, max_retries): i
+            for i, (current_chunk, chunk_idx) in enumerate(chunks)
+        }
         try:
-            detection_result = json.loads(response.choices[0].message.content)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, skip this chunk
-            if max_retries - current_retries > 0:
-                current_retries += 1
-            else:
-                current_retries = 0
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # A partial extraction must not pass as a complete one
+                    logger.error(f"Object extraction failed for chunk {chunks[i][1]} of doc {doc_id}: {e}")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
                 pbar.update(1)
-            continue
-        
-        current_retries = 0
-        pbar.update(1)
-        
-        # Process all objects found in this chunk
-        objects = detection_result.get("objects", [])
-        for obj in objects:
-            object_type = obj.get("object_type")
-            object_name = obj.get("object_name")
-            
-            if object_type and object_name:
-                # Create the extracted object
-                extracted_object = {
-                    "name": object_name,
-                    "type": object_type,
-                    "doc_id": doc_id,
-                    "chunk_id_s": chunk_idx,
-                    "chunk_id_e": chunk_idx
-                }
-                extracted_objects.append(extracted_object)
+        finally:
+            pbar.close()
 
-    return extracted_objects
+    return [obj for chunk_objects in results for obj in chunk_objects]
 
-def insert_objects(extracted_objects: List[Dict[str, Any]]):
+def insert_objects(extracted_objects: List[Dict[str, Any]], batch_size: int = None):
     """
     Process chunks to extract objects and store them in Neo4j.
     
     Args:
         extracted_objects: List of objects to insert
+        batch_size: Number of objects created per round trip
     """
-    result = []
+    rows = []
 
     # Mapping of object types to their Neo4j labels
     type_to_label = {
@@ -186,15 +247,15 @@ def insert_objects(extracted_objects: List[Dict[str, Any]]):
     for obj in extracted_objects:
         obj_type = obj["type"]
         if obj_type in type_to_label:
-            result.append(add_knowledge_object(
-                obj["name"], 
-                type_to_label[obj_type],
-                obj["doc_id"], 
-                obj["chunk_id_s"], 
-                obj["chunk_id_e"]
-            ))
+            rows.append({
+                "name": obj["name"],
+                "label": type_to_label[obj_type],
+                "doc_id": obj["doc_id"],
+                "chunk_id_s": obj["chunk_id_s"],
+                "chunk_id_e": obj["chunk_id_e"]
+            })
     
-    return result
+    return add_knowledge_objects(rows, batch_size)
 
 def make_study_object(chunks: List[Tuple[str, int]], doc_id: int, prompt_key: str = "general_textbook_prompt"):
     objects = extract_objects_from_chunks(chunks, doc_id, prompt_key)
@@ -202,6 +263,8 @@ def make_study_object(chunks: List[Tuple[str, int]], doc_id: int, prompt_key: st
 
     object_nodes = insert_objects(objects)
     logger.info("Objects inserted successfully")
+    # Already-read chunks may have gained objects; let the next track event assign them
+    reset_reading_progress(doc_id)
 
 prompts_available = list(prompts.keys())
 
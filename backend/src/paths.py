@@ -4,6 +4,10 @@ src_path = os.path.dirname(__file__)
 backend_path = os.path.dirname(src_path)
 output_path = os.path.join(backend_path, "output")
 upload_path = os.path.join(backend_path, "uploads")
+spool_path = os.path.join(backend_path, "spool")
+reader_cache_path = os.path.join(backend_path, "reader_cache")
+file_cache_path = os.path.join(backend_path, "file_cache")
+storage_path = os.path.join(backend_path, "storage")
 
 if not os.path.exists(output_path):
     os.makedirs(output_path)
@@ -11,6 +15,15 @@ if not os.path.exists(output_path):
 if not os.path.exists(upload_path):
     os.makedirs(upload_path)
 
+if not os.path.exists(spool_path):
+    os.makedirs(spool_path)
+
+if not os.path.exists(reader_cache_path):
+    os.makedirs(reader_cache_path)
+
+if not os.path.exists(file_cache_path):
+    os.makedirs(file_cache_path)
+
 def get_output_folder(doc_name: str, backend: str = None):
     backend = backend.split("/")[-1] if backend is not None else None
     name = os.path.splitext(os.path.basename(doc_name))[0]
@@ -29,3 +42,7 @@ def get_output_folder(doc_name: str, backend: str = None):
 def make_content_path(doc_name: str, backend: str = None):
     name = os.path.splitext(os.path.basename(doc_name))[0]
     return os.path.join(get_output_folder(doc_name, backend), name + "_content_list.json")
+
+def make_markdown_path(doc_name: str, backend: str = None):
+    name = os.path.splitext(os.path.basename(doc_name))[0]
+    return os.path.join(get_output_folder(doc_name, backend), name + ".md")
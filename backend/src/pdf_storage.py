@@ -1,95 +1,79 @@
-import os
 from io import BytesIO, BufferedReader
-from typing import Optional, Union
+from typing import Dict, Iterator, Optional, Union
 
-from azure.storage.blob import BlobServiceClient
+from .storage import get_storage
+from .file_cache import file_cache
+import logging
 
+logger = logging.getLogger(__name__)
 
-_blob_service_client: Optional[BlobServiceClient] = None
 
+def store_file(doc_id: int, file_obj: Union[BytesIO, bytes, BufferedReader, "UploadFile", "SpooledUpload"]) -> Dict:
+    """Store a PDF as "{doc_id}.pdf" in the configured storage backend.
 
-def _get_blob_service_client() -> BlobServiceClient:
-    global _blob_service_client
-    if _blob_service_client is not None:
-        return _blob_service_client
+    Returns its size, ETag and last-modified time.
+    """
+    storage = get_storage()
+    name = f"{doc_id}.pdf"
+    info = storage.store(name, file_obj)
+
+    # Write-through to the local cache for remote backends; a spooled upload is copied file to file
+    if storage.local_path(name) is None:
+        try:
+            if isinstance(getattr(file_obj, "path", None), str):
+                source = file_obj.path
+            elif isinstance(file_obj, (bytes, bytearray)):
+                source = bytes(file_obj)
+            else:
+                source = getattr(file_obj, "file", file_obj)
+                source.seek(0)
+            file_cache.put(doc_id, source, info["etag"], info["last_modified"])
+        except Exception as e:
+            file_cache.delete(doc_id)
+            logger.warning(f"Failed to cache {name} locally: {e}")
+    return info
 
-    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
 
-    if connection_string:
-        _blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        return _blob_service_client
+def fet_file(doc_id: int) -> bytes:
+    """Read the whole PDF for the given doc_id."""
+    return b"".join(get_storage().open_stream(f"{doc_id}.pdf"))
 
-    if not account_name or not account_key:
-        raise RuntimeError(
-            "Azure Storage credentials are not configured. Set AZURE_STORAGE_CONNECTION_STRING or both AZURE_STORAGE_ACCOUNT_NAME and AZURE_STORAGE_ACCOUNT_KEY."
-        )
 
-    account_url = f"https://{account_name}.blob.core.windows.net"
-    _blob_service_client = BlobServiceClient(account_url=account_url, credential=account_key)
-    return _blob_service_client
+def stat_file(doc_id: int) -> Dict:
+    """Size, ETag and last-modified time of the stored PDF for doc_id."""
+    return get_storage().stat(f"{doc_id}.pdf")
 
 
-def _get_primary_container_name() -> str:
-    names = os.getenv("AZURE_STORAGE_CONTAINER_NAMES", "").split(",")
-    names = [n.strip() for n in names if n.strip()]
-    if not names:
-        raise RuntimeError("AZURE_STORAGE_CONTAINER_NAMES is not set or empty")
-    return names[0]
+def stream_file(doc_id: int, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the bytes start..end (inclusive) of the stored PDF in blocks, without reading it whole."""
+    return get_storage().open_stream(f"{doc_id}.pdf", start, end)
 
 
-def store_file(doc_id: int, file_obj: Union[BytesIO, bytes, BufferedReader, "UploadFile"]) -> str:
-    """Upload a PDF to Azure Blob Storage as "{doc_id}.pdf" into the primary container.
-
-    Returns the blob URL.
-    """
-    container = _get_primary_container_name()
-    blob_name = f"{doc_id}.pdf"
-    bsc = _get_blob_service_client()
-    blob_client = bsc.get_blob_client(container=container, blob=blob_name)
-
-    # Ensure container exists (no-op if it already exists)
-    try:
-        bsc.create_container(container)
-    except Exception:
-        # Likely already exists or insufficient perms to create; ignore
-        pass
-
-    # Normalize input to bytes-like stream
-    data: Union[BytesIO, bytes]
-    try:
-        # FastAPI UploadFile compatibility without import cycle
-        from starlette.datastructures import UploadFile  # type: ignore
-        if isinstance(file_obj, UploadFile):  # type: ignore
-            file_obj.file.seek(0)
-            data = file_obj.file.read()
-        else:
-            raise ImportError  # jump to except path
-    except Exception:
-        if isinstance(file_obj, (bytes, bytearray)):
-            data = bytes(file_obj)
-        elif hasattr(file_obj, "read"):
-            # File-like object
-            try:
-                file_obj.seek(0)  # type: ignore
-            except Exception:
-                pass
-            data = file_obj.read()
-        else:
-            raise TypeError("Unsupported file_obj type for store_file")
-
-    blob_client.upload_blob(data, overwrite=True, content_type="application/pdf")
-    return blob_client.url
-
-
-def fet_file(doc_id: int) -> bytes:
-    """Download the PDF bytes for the given doc_id from Azure Blob Storage."""
-    container = _get_primary_container_name()
-    blob_name = f"{doc_id}.pdf"
-    bsc = _get_blob_service_client()
-    blob_client = bsc.get_blob_client(container=container, blob=blob_name)
-    stream = blob_client.download_blob()
-    return stream.readall()
+def delete_file(doc_id: int) -> None:
+    get_storage().delete(f"{doc_id}.pdf")
+    file_cache.delete(doc_id)
 
 
+def cached_file(doc_id: int) -> Optional[Dict]:
+    """
+    Local copy of the stored PDF ({"path", "size", "etag", "last_modified"}). Local storage is
+    used in place; other backends go through the file cache, filled on a miss. None if the
+    file is larger than the cache budget.
+    """
+    storage = get_storage()
+    name = f"{doc_id}.pdf"
+    path = storage.local_path(name)
+    if path is not None:
+        return {"path": path, **storage.stat(name)}
+    entry = file_cache.get(doc_id)
+    if entry is not None:
+        return entry
+    with file_cache.fill_lock(doc_id):
+        # Another request may have filled it while we waited
+        entry = file_cache.get(doc_id, count=False)
+        if entry is not None:
+            return entry
+        info = storage.stat(name)
+        if info["size"] > file_cache.max_bytes:
+            return None
+        return file_cache.put(doc_id, storage.open_stream(name), info["etag"], info["last_modified"])
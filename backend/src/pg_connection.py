@@ -1,13 +1,196 @@
 from psycopg2 import connect
+from psycopg2 import extensions
+from contextlib import contextmanager
+from collections import deque
+from typing import Dict
+import threading
+import time
 import os
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 dbname = os.getenv("PG_DBNAME")
 user = os.getenv("PG_USER")
 host = os.getenv("PG_HOST")
 password = os.getenv("PG_PASSWORD")
 
+pool_max_size = int(os.getenv("PG_POOL_MAX", "10"))
+pool_timeout = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+# Idle connections older than this are pinged with SELECT 1 before being handed out
+pool_health_check_after = float(os.getenv("PG_POOL_HEALTH_CHECK_SECONDS", "30"))
+
 def get_connection():
-    return connect(dbname=dbname, user=user, host=host, password=password)
\ No newline at end of file
+    """Open a new, unpooled connection. Prefer `connection()` for data access."""
+    return connect(dbname=dbname, user=user, host=host, password=password)
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class PoolClosed(RuntimeError):
+    pass
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to `max_size`; callers beyond that wait up
+    to `timeout` seconds for a connection to be returned.
+    """
+    def __init__(self, max_size: int, timeout: float, health_check_after: float) -> None:
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if time.monotonic() - last_used > self.health_check_after:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _open(self):
+        try:
+            return get_connection()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolClosed("Postgres connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No Postgres connection available after {self.timeout}s (pool size {self.max_size})")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                wait = time.monotonic() - start
+                self._stats["waits"] += 1
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+
+        if conn is None:
+            return self._open()
+        if not self._is_healthy(conn, last_used):
+            logger.info("Replacing unhealthy pooled Postgres connection")
+            self._close(conn)
+            with self._cond:
+                self._stats["discarded"] += 1
+            return self._open()
+        return conn
+
+    def _release(self, conn, discard: bool = False) -> None:
+        # Connections returned after close_all() are closed instead of pooled
+        discard = discard or self._closed
+        if discard or conn.closed:
+            self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for one transaction. Commits on success, rolls
+        back on error and always returns the connection to the pool.
+        """
+        conn = self._acquire()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self._release(conn, discard)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            })
+        return stats
+
+    def close_all(self) -> None:
+        """
+        Close idle connections and refuse new checkouts. Waiting callers raise PoolClosed;
+        connections still in use are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+pool = ConnectionPool(pool_max_size, pool_timeout, pool_health_check_after)
+
+def connection():
+    """Context manager checking out a pooled connection: `with connection() as conn: ...`"""
+    return pool.connection()
+
+def pool_stats() -> Dict:
+    return pool.stats()
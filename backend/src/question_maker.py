@@ -96,6 +96,7 @@ Guidelines:
 
 
 completion_tokens = 10000
+question_system_prompt = "You are an expert teacher. Always respond with valid JSON."
 model_name = os.getenv("MODEL_NAME")
 max_retries = 3
 max_questions_per_type = 1
@@ -103,24 +104,29 @@ max_questions_per_node = 1
 
 from .neo4j_connection import driver
 from .chunk_maper import chunk_maper
+from .llm_cache import get_cached_response, set_cached_response
 import numpy as np
 
 # TODO: Check this
-def sample_question_type(node_id: str):
-    query = """
-    MATCH (q:ReviewQuestion)-[:QUESTION_FOR]->(n)
-    WHERE elementId(n) = $node_id
-    RETURN q.type AS type, COUNT(q) AS total
+def sample_question_type(node_id: str, type_counts: Dict[str, int] = None):
     """
-    result = driver.execute_query(query, node_id=node_id)
+    Sample the type of the next question to generate for a node, or None if it has enough.
+    type_counts ({question type: number of questions}) skips the count query when already known.
+    """
+    if type_counts is None:
+        query = """
+        MATCH (q:ReviewQuestion)-[:QUESTION_FOR]->(n:BookKnowledge)
+        WHERE elementId(n) = $node_id
+        RETURN q.type AS type, COUNT(q) AS total
+        """
+        result = driver.execute_query(query, node_id=node_id)
+        type_counts = {record["type"]: record["total"] for record in result.records}
 
     # Initialize counts for all types; drop types at per-type cap
     question_types_count = {q_type: 0 for q_type in question_types.keys()}
     total_questions = 0
 
-    for record in result.records:
-        type_key = record["type"]
-        total = record["total"]
+    for type_key, total in type_counts.items():
         total_questions += total
         if total >= max_questions_per_type:
             question_types_count.pop(type_key, None)
@@ -167,27 +173,31 @@ def sample_question_type(node_id: str):
         return None
     return res.item() if hasattr(res, "item") else res
 
-def make_review_questions(node_id: str, question_type: str = None):
-    if question_type is None:
-        return None
-    query = """
-    MATCH (m)
-    WHERE elementId(m) = $node_id
-    RETURN m.name, m.type, m.chunk_id_s, m.chunk_id_e, m.doc_id
+def make_review_questions(node_id: str, question_type: str = None, node=None, reference: str = None):
     """
-    result = driver.execute_query(query, node_id=node_id)
-    
-    # Check if any records were returned
-    if not result.records:
-        logger.error(f"No node found with ID: {node_id}")
+    Generate and store review questions of the given type for a knowledge node.
+    node (the BookKnowledge node) and reference (its text) skip the lookups when already fetched.
+    """
+    if question_type is None:
         return None
+    if node is None:
+        query = """
+        MATCH (m:BookKnowledge)
+        WHERE elementId(m) = $node_id
+        RETURN m
+        """
+        result = driver.execute_query(query, node_id=node_id)
+
+        # Check if any records were returned
+        if not result.records:
+            logger.error(f"No node found with ID: {node_id}")
+            return None
+        node = result.records[0]["m"]
     
-    name = result.records[0]["m.name"]
-    type_knowledge = result.records[0]["m.type"]
-    chunk_id_s = result.records[0]["m.chunk_id_s"]
-    chunk_id_e = result.records[0]["m.chunk_id_e"]
-    doc_id = result.records[0]["m.doc_id"]
-    reference = chunk_maper(doc_id, chunk_id_s, chunk_id_e)
+    name = node["name"]
+    type_knowledge = node["type"]
+    if reference is None:
+        reference = chunk_maper(node["doc_id"], node["chunk_id_s"], node["chunk_id_e"])
 
     # Get description from the dictionary
     if question_type not in question_types:
@@ -195,28 +205,36 @@ def make_review_questions(node_id: str, question_type: str = None):
         return None
     
     description = question_types[question_type]
+    user_prompt = question_prompt.format(name=name, type=type_knowledge, reference=reference, question_type=question_type, description=description)
     question_result = None
-    
-    for _ in range(max_retries):
+
+    cached = get_cached_response(model_name, question_system_prompt + question_prompt, user_prompt)
+    if cached is not None:
+        question_result = json.loads(cached)
+
+    for _ in range(max_retries if question_result is None else 0):
     
         response = client.chat.completions.create(
             messages=[
                 {
                     "role": "system",
-                    "content": "You are an expert teacher. Always respond with valid JSON."
+                    "content": question_system_prompt
                 },
                 {
                     "role": "user",
-                    "content": question_prompt.format(name=name, type=type_knowledge, reference=reference, question_type=question_type, description=description)
+                    "content": user_prompt
                 }
             ],
             max_completion_tokens=completion_tokens,
             model=model_name
         )
 
+        content = response.choices[0].message.content
         try:
-            question_result = json.loads(response.choices[0].message.content)
+            question_result = json.loads(content)
             assert ["knowledge_name", "knowledge_type", "question_type", "questions"] == list(question_result.keys())
+            set_cached_response(model_name, question_system_prompt + question_prompt, user_prompt, content)
+            break
         except json.JSONDecodeError:
             pass
     if question_result is None:
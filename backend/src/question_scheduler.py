@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+from dotenv import load_dotenv
+from .neo4j_connection import driver
+from .question_maker import sample_question_type, make_review_questions, max_questions_per_node
+import logging
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+# Items becoming due within this window get their questions generated ahead of time
+lookahead_minutes = float(os.getenv("QUESTION_PREGEN_LOOKAHEAD_MINUTES", "60"))
+# Maximum number of question-generation LLM calls in flight
+pregen_concurrency = int(os.getenv("QUESTION_PREGEN_CONCURRENCY", "4"))
+pregen_interval_seconds = float(os.getenv("QUESTION_PREGEN_INTERVAL_SECONDS", "60"))
+pregen_batch_size = int(os.getenv("QUESTION_PREGEN_BATCH", "100"))
+
+
+def get_upcoming_without_questions(lookahead_minutes: float, limit: int) -> List[str]:
+    """
+    Element ids of knowledge nodes due for some user within the look-ahead window
+    that have fewer than max_questions_per_node review questions.
+    """
+    result = driver.execute_query(
+        """
+        MATCH (n:BookKnowledge)-[:LAST_REPEATED]->(r:RepetitionState)
+        WHERE r.next_repeat < datetime() + duration({seconds: $lookahead_seconds})
+        WITH DISTINCT n, min(r.next_repeat) AS due
+        WHERE COUNT { (:ReviewQuestion)-[:QUESTION_FOR]->(n) } < $max_questions
+        RETURN elementId(n) AS node_id
+        ORDER BY due ASC
+        LIMIT $limit
+        """,
+        lookahead_seconds=int(lookahead_minutes * 60), max_questions=max_questions_per_node, limit=limit
+    )
+    return [record["node_id"] for record in result.records]
+
+
+def pregenerate_question(node_id: str) -> bool:
+    question_type = sample_question_type(node_id)
+    if question_type is None:
+        return False
+    return bool(make_review_questions(node_id, question_type))
+
+
+class QuestionPregenerator:
+    """
+    Background thread that generates ReviewQuestion nodes for repetition
+    states becoming due soon, so quiz endpoints only read existing questions.
+    """
+    def __init__(self, lookahead_minutes: float = lookahead_minutes, concurrency: int = pregen_concurrency,
+                 interval_seconds: float = pregen_interval_seconds, batch_size: int = pregen_batch_size) -> None:
+        self.lookahead_minutes = lookahead_minutes
+        self.concurrency = max(1, concurrency)
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "generated": 0, "failed": 0, "last_batch": 0}
+
+    def run_once(self) -> int:
+        """Generate questions for one batch of upcoming items. Returns the number generated."""
+        node_ids = get_upcoming_without_questions(self.lookahead_minutes, self.batch_size)
+        generated = failed = 0
+        if node_ids:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = [executor.submit(pregenerate_question, node_id) for node_id in node_ids]
+                for node_id, future in zip(node_ids, futures):
+                    try:
+                        generated += int(future.result())
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Question pre-generation failed for node {node_id}: {e}")
+            logger.info(f"Pre-generated questions for {generated}/{len(node_ids)} upcoming items")
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["generated"] += generated
+            self._stats["failed"] += failed
+            self._stats["last_batch"] = len(node_ids)
+        return generated
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                generated = self.run_once()
+            except Exception as e:
+                logger.error(f"Question pre-generation run failed: {e}")
+                generated = 0
+            # A full batch means more work is waiting; otherwise sleep until the next interval
+            if generated < self.batch_size:
+                self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="question-pregenerator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "running": self._thread is not None and self._thread.is_alive(),
+            "lookahead_minutes": self.lookahead_minutes,
+            "concurrency": self.concurrency,
+        })
+        return stats
+
+
+question_pregenerator = QuestionPregenerator()
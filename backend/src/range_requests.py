@@ -0,0 +1,89 @@
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def quote_etag(etag: str) -> str:
+    return etag if etag.startswith('"') or etag.startswith('W/') else f'"{etag}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value, usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as for If-None-Match
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, last_modified: datetime) -> bool:
+    """True if the conditional request headers allow answering 304 Not Modified."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    since = _parse_http_date(headers.get("if-modified-since", ""))
+    # HTTP dates have second precision
+    return since is not None and last_modified.replace(microsecond=0) <= since
+
+
+def parse_range(headers: Mapping[str, str], size: int, etag: str, last_modified: datetime) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) byte range requested by a single-range "Range: bytes=..." header,
+    or None to send the whole file (no Range, a stale If-Range, or a multi-range request).
+    Raises RangeNotSatisfiable for ranges outside the file.
+    """
+    header = headers.get("range")
+    if header is None or not header.startswith("bytes="):
+        return None
+    if_range = headers.get("if-range")
+    if if_range is not None:
+        date = _parse_http_date(if_range)
+        if date is None and if_range.strip() != etag:
+            return None
+        if date is not None and last_modified.replace(microsecond=0) > date:
+            return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    first, _, last = spec.partition("-")
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def file_headers(size: int, etag: str, last_modified: datetime, byte_range: Optional[Tuple[int, int]] = None) -> Dict[str, str]:
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+    }
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        headers["Content-Length"] = str(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return headers
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+from .paths import reader_cache_path, output_path
+from .upload_spool import block_size
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # This makes it show in terminal
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+max_bytes = int(float(os.getenv("READER_CACHE_MAX_MB", "2048")) * 1048576)
+
+
+def content_hash(file: Any) -> str:
+    """SHA-256 of an upload's content, reusing the hash computed while spooling when there is one."""
+    sha256 = getattr(file, "sha256", None)
+    if sha256 is not None:
+        return sha256
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    for block in iter(lambda: file.file.read(block_size), b""):
+        digest.update(block)
+    file.file.seek(0)
+    return digest.hexdigest()
+
+
+def make_reader_key(sha256: str, reader_name: str, settings: Dict) -> str:
+    payload = json.dumps({"sha256": sha256, "reader": reader_name, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _tree_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class ReaderOutputCache:
+    """
+    On-disk cache of reader output: the markdown content plus, for readers that produce one,
+    the result folder (MinerU's content list and images).
+
+    Each entry is a directory named by its key, written to a temporary directory and renamed
+    into place. Recency is the mtime of the entry's meta.json; least recently used entries
+    are removed once the total size exceeds max_bytes.
+    """
+    def __init__(self, root: str = reader_cache_path, max_bytes: int = max_bytes) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key: str, filename: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(content, result_folder) or None. A cached folder is restored under the output path for filename."""
+        path = os.path.join(self.root, key)
+        meta_path = os.path.join(path, "meta.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(os.path.join(path, "content.md"), "r", encoding="utf-8") as f:
+                content = f.read()
+            result_folder = self._restore_folder(path, meta, filename) if meta["backend"] is not None else None
+            os.utime(meta_path)
+        except OSError:
+            # Missing or evicted concurrently
+            self._count("misses")
+            return None
+        self._count("hits")
+        return content, result_folder
+
+    def _restore_folder(self, path: str, meta: Dict, filename: str) -> str:
+        # Readers name their output files after the document, so rename them for this filename
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        target = os.path.join(output_path, stem, meta["backend"])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(target), prefix=".tmp-")
+        try:
+            staged = os.path.join(tmp, meta["backend"])
+            shutil.copytree(os.path.join(path, "folder"), staged)
+            for name in os.listdir(staged):
+                if name.startswith(meta["stem"]):
+                    os.rename(os.path.join(staged, name), os.path.join(staged, stem + name[len(meta["stem"]):]))
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.rename(staged, target)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return target
+
+    def put(self, key: str, filename: str, content: str, result_folder: Optional[str] = None) -> None:
+        path = os.path.join(self.root, key)
+        if os.path.exists(path):
+            return
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            with open(os.path.join(tmp, "content.md"), "w", encoding="utf-8") as f:
+                f.write(content)
+            if result_folder is not None:
+                shutil.copytree(result_folder, os.path.join(tmp, "folder"))
+            meta = {
+                "stem": os.path.splitext(os.path.basename(filename))[0],
+                "backend": os.path.basename(result_folder) if result_folder is not None else None,
+                "size": _tree_size(tmp),
+            }
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                return  # stored concurrently
+            self._count("stores")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for key in os.listdir(self.root):
+            if key.startswith("."):
+                continue
+            meta_path = os.path.join(self.root, key, "meta.json")
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    size = json.load(f)["size"]
+                entries.append((os.path.getmtime(meta_path), size, key))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(entry[1] for entry in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                total -= size
+                self._stats["evictions"] += 1
+                logger.info(f"Evicted reader output {key}")
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"entries": len(entries), "bytes": sum(entry[1] for entry in entries), "max_bytes": self.max_bytes})
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+reader_cache = ReaderOutputCache()
+
+
+def reader_cache_stats() -> Dict:
+    return reader_cache.stats()
@@ -1,5 +1,5 @@
 from typing import Optional
-from .pg_connection import get_connection
+from .pg_connection import connection
 
 
 CREATE_TABLE_CHUNKS = """
@@ -22,8 +22,11 @@ CREATE TABLE IF NOT EXISTS public.docs_metadata (
     size_mb  numeric(12,6) DEFAULT 0.0,
     "date"   timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
     name     text NOT NULL,
-    folder   text
+    folder   text,
+    sha256   text
 );
+ALTER TABLE public.docs_metadata ADD COLUMN IF NOT EXISTS sha256 text;
+CREATE UNIQUE INDEX IF NOT EXISTS docs_metadata_sha256_idx ON public.docs_metadata (sha256) WHERE sha256 IS NOT NULL;
 """
 
 
@@ -38,16 +41,61 @@ CREATE TABLE IF NOT EXISTS public.users (
 """
 
 
+CREATE_TABLE_LLM_CACHE = """
+CREATE TABLE IF NOT EXISTS public.llm_cache (
+    key          text PRIMARY KEY,
+    model        text,
+    prompt_hash  text NOT NULL,
+    response     text NOT NULL,
+    size_bytes   integer NOT NULL,
+    created_at   timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_used_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS llm_cache_last_used_at_idx ON public.llm_cache (last_used_at);
+"""
+
+
+CREATE_TABLE_READING_PROGRESS = """
+CREATE TABLE IF NOT EXISTS public.reading_progress (
+    userid     text NOT NULL,
+    doc_id     integer NOT NULL,
+    max_chunk  integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (userid, doc_id)
+);
+"""
+
+
+CREATE_TABLE_INGESTION_JOBS = """
+CREATE TABLE IF NOT EXISTS public.ingestion_jobs (
+    id           integer GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    userid       text NOT NULL,
+    filename     text NOT NULL,
+    reader       text NOT NULL,
+    spool_path   text NOT NULL,
+    sha256       text NOT NULL,
+    size_bytes   bigint NOT NULL,
+    status       text NOT NULL DEFAULT 'queued',
+    stage        text,
+    stages       jsonb NOT NULL DEFAULT '{}'::jsonb,
+    doc_id       integer,
+    chunks_count integer,
+    error        text,
+    created_at   timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at   timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ingestion_jobs_status_idx ON public.ingestion_jobs (status);
+"""
+
+
 def ensure_tables_exist() -> None:
-    conn = get_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(CREATE_TABLE_CHUNKS)
-            cursor.execute(CREATE_TABLE_DOCS_METADATA)
-            cursor.execute(CREATE_TABLE_USERS)
-        conn.commit()
-    finally:
-        conn.close()
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_CHUNKS)
+        cursor.execute(CREATE_TABLE_DOCS_METADATA)
+        cursor.execute(CREATE_TABLE_USERS)
+        cursor.execute(CREATE_TABLE_LLM_CACHE)
+        cursor.execute(CREATE_TABLE_READING_PROGRESS)
+        cursor.execute(CREATE_TABLE_INGESTION_JOBS)
 
 
 if __name__ == "__main__":
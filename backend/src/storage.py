@@ -0,0 +1,220 @@
+import mmap
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Union
+
+from azure.storage.blob import BlobServiceClient
+from dotenv import load_dotenv
+from .paths import storage_path
+from .upload_spool import block_size
+
+load_dotenv()
+
+local_storage_path = os.getenv("STORAGE_LOCAL_PATH", storage_path)
+
+
+def _as_source(file_obj: Any) -> Union[BinaryIO, bytes, str]:
+    """Normalize store() input to bytes, a spool file path, or a stream positioned at the start."""
+    if isinstance(file_obj, (bytes, bytearray)):
+        return bytes(file_obj)
+    if isinstance(getattr(file_obj, "path", None), str):
+        # SpooledUpload
+        return file_obj.path
+    if hasattr(file_obj, "file"):
+        # FastAPI UploadFile
+        file_obj.file.seek(0)
+        return file_obj.file
+    if hasattr(file_obj, "read"):
+        try:
+            file_obj.seek(0)
+        except Exception:
+            pass
+        return file_obj
+    raise TypeError("Unsupported file_obj type for store")
+
+
+class StorageBackend(ABC):
+    """
+    Where uploaded files live. stat() and store() return {"size", "etag", "last_modified"}.
+    """
+    name = "UndefinedStorage"
+
+    @abstractmethod
+    def store(self, name: str, file_obj: Any, content_type: str = "application/pdf") -> Dict:
+        pass
+
+    @abstractmethod
+    def open_stream(self, name: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive) in blocks of at most block_size."""
+        pass
+
+    @abstractmethod
+    def stat(self, name: str) -> Dict:
+        pass
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        pass
+
+    def local_path(self, name: str) -> Optional[str]:
+        """Path of the file on this machine, for backends that can be served with sendfile."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str = local_storage_path) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, os.path.basename(name))
+
+    def store(self, name: str, file_obj: Any, content_type: str = "application/pdf") -> Dict:
+        source = _as_source(file_obj)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if isinstance(source, bytes):
+                    out.write(source)
+                elif not isinstance(source, str):
+                    shutil.copyfileobj(source, out, block_size)
+            if isinstance(source, str):
+                # copy_file_range/sendfile under the hood
+                shutil.copyfile(source, tmp)
+            os.replace(tmp, self._path(name))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return self.stat(name)
+
+    def open_stream(self, name: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self._path(name), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size - 1 if end is None else min(end, size - 1)
+            if start > end:
+                return
+            # Blocks are sliced straight out of the page cache, without read() calls or buffering.
+            # Slices are bytes, not memoryviews, so the server may hold them after the map is closed.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(start, end + 1, block_size):
+                    yield mapped[offset:min(offset + block_size, end + 1)]
+
+    def stat(self, name: str) -> Dict:
+        result = os.stat(self._path(name))
+        return {
+            "size": result.st_size,
+            "etag": f'"{result.st_mtime_ns:x}-{result.st_size:x}"',
+            "last_modified": datetime.fromtimestamp(result.st_mtime, timezone.utc),
+        }
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, name: str) -> Optional[str]:
+        return self._path(name)
+
+
+class AzureBlobStorage(StorageBackend):
+    name = "azure"
+
+    def __init__(self) -> None:
+        self._client: Optional[BlobServiceClient] = None
+        self._container_checked = False
+
+    def _get_blob_service_client(self) -> BlobServiceClient:
+        if self._client is not None:
+            return self._client
+
+        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+        account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+
+        # Downloads are fetched in blocks of block_size so a streamed read holds one block at a time
+        if connection_string:
+            self._client = BlobServiceClient.from_connection_string(
+                connection_string, max_single_get_size=block_size, max_chunk_get_size=block_size
+            )
+            return self._client
+
+        if not account_name or not account_key:
+            raise RuntimeError(
+                "Azure Storage credentials are not configured. Set AZURE_STORAGE_CONNECTION_STRING or both AZURE_STORAGE_ACCOUNT_NAME and AZURE_STORAGE_ACCOUNT_KEY."
+            )
+
+        account_url = f"https://{account_name}.blob.core.windows.net"
+        self._client = BlobServiceClient(
+            account_url=account_url, credential=account_key,
+            max_single_get_size=block_size, max_chunk_get_size=block_size
+        )
+        return self._client
+
+    def _get_primary_container_name(self) -> str:
+        names = os.getenv("AZURE_STORAGE_CONTAINER_NAMES", "").split(",")
+        names = [n.strip() for n in names if n.strip()]
+        if not names:
+            raise RuntimeError("AZURE_STORAGE_CONTAINER_NAMES is not set or empty")
+        return names[0]
+
+    def _blob_client(self, name: str):
+        return self._get_blob_service_client().get_blob_client(container=self._get_primary_container_name(), blob=name)
+
+    def store(self, name: str, file_obj: Any, content_type: str = "application/pdf") -> Dict:
+        if not self._container_checked:
+            # Ensure container exists (no-op if it already exists)
+            try:
+                self._get_blob_service_client().create_container(self._get_primary_container_name())
+            except Exception:
+                # Likely already exists or insufficient perms to create; ignore
+                pass
+            self._container_checked = True
+
+        # Streams are uploaded in blocks, never read whole
+        source = _as_source(file_obj)
+        length = getattr(file_obj, "size", None)
+        blob_client = self._blob_client(name)
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                result = blob_client.upload_blob(f, length=length, overwrite=True, content_type=content_type)
+        else:
+            result = blob_client.upload_blob(source, length=length, overwrite=True, content_type=content_type)
+        size = length if length is not None else self.stat(name)["size"]
+        return {"size": size, "etag": result["etag"], "last_modified": result["last_modified"]}
+
+    def open_stream(self, name: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        length = end - start + 1 if end is not None else None
+        downloader = self._blob_client(name).download_blob(offset=start, length=length, max_concurrency=1)
+        yield from downloader.chunks()
+
+    def stat(self, name: str) -> Dict:
+        properties = self._blob_client(name).get_blob_properties()
+        return {"size": properties.size, "etag": properties.etag, "last_modified": properties.last_modified}
+
+    def delete(self, name: str) -> None:
+        self._blob_client(name).delete_blob()
+
+
+backends = {
+    "azure": AzureBlobStorage,
+    "local": LocalStorage,
+}
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """The backend selected by STORAGE_BACKEND ("azure" or "local"), created on first use."""
+    global _storage
+    if _storage is None:
+        backend = os.getenv("STORAGE_BACKEND", "azure").lower()
+        if backend not in backends:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND {backend}, expected one of {', '.join(backends)}")
+        _storage = backends[backend]()
+    return _storage
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional
+from .paths import spool_path
+
+# Size of the blocks an upload is read, hashed and written in
+block_size = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
+
+
+class SpooledUpload:
+    """
+    An uploaded file read once into a temporary file on disk.
+
+    Exposes the parts of UploadFile the readers and storage use (filename, size, file),
+    plus the SHA-256 of the content. The temporary file is removed on close.
+    """
+    def __init__(self, filename: str, path: str, size: int, sha256: str) -> None:
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def file(self) -> BinaryIO:
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, "rb")
+        return self._file
+
+    def rewind(self) -> None:
+        self.file.seek(0)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def spool_upload(source: BinaryIO, filename: str, size: int = block_size) -> SpooledUpload:
+    """
+    Copy a file-like object to a temporary file in fixed-size blocks while hashing it,
+    so peak memory stays at one block regardless of file size.
+    """
+    digest = hashlib.sha256()
+    total = 0
+    fd, path = tempfile.mkstemp(dir=spool_path, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = source.read(size)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+                total += len(block)
+    except Exception:
+        os.remove(path)
+        raise
+    return SpooledUpload(filename, path, total, digest.hexdigest())
@@ -1,8 +1,10 @@
 import psycopg2
 from dotenv import load_dotenv
-from .pg_connection import get_connection
-from .neo4j_graph import get_objects, merge_repetition_state
+from .pg_connection import connection
+from .neo4j_graph import get_objects, merge_repetition_states
 from .repetition import RepeatState
+from .mastery import invalidate_mastery
+from .due_counts import invalidate_due_count
 import logging
 
 logging.basicConfig(
@@ -16,8 +18,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def insert_user(gmail: str, password: str, username: str):
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO public.users (gmail, password, name)
@@ -27,13 +28,11 @@ def insert_user(gmail: str, password: str, username: str):
             (gmail, password, username)
         )
         id = cursor.fetchone()[0]
-        conn.commit()
     return id
 
 def authorize_user(password: str, name_or_gmail: str):
     assert name_or_gmail is not None
-    conn = get_connection()
-    with conn.cursor() as cursor:
+    with connection() as conn, conn.cursor() as cursor:
         cursor.execute(
             """
             SELECT id FROM public.users WHERE password = %s AND (name = %s OR gmail = %s)
@@ -47,7 +46,61 @@ def authorize_user(password: str, name_or_gmail: str):
             id = None
     return id
 
-def assign_objects(user_id: int, chunk_id: int, doc_id: int):
-    object_nodes = get_objects(chunk_id, doc_id)
-    for object in object_nodes: merge_repetition_state(object.element_id, RepeatState(user_id, 0))
+def assign_objects(user_id: int, chunk_id: int, doc_id: int, after_chunk_id: int = None):
+    """
+    Assign to the user every object of the document ending at or before chunk_id.
+    If after_chunk_id is given, only objects ending after it are assigned.
+    """
+    object_nodes = get_objects(chunk_id, doc_id, after_chunk_id)
+    merge_repetition_states([(object.element_id, RepeatState(user_id, 0)) for object in object_nodes])
     logger.info(f"Assigned {len(object_nodes)} objects to user {user_id}")
+    return len(object_nodes)
+
+def get_reading_progress(user_id: str, doc_id: int) -> int:
+    """The user's high-water mark of tracked chunks in the document (-1 if never tracked)."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT max_chunk FROM public.reading_progress WHERE userid = %s AND doc_id = %s",
+            (str(user_id), doc_id)
+        )
+        row = cursor.fetchone()
+    return -1 if row is None else row[0]
+
+def advance_reading_progress(user_id: str, doc_id: int, chunk_id: int) -> None:
+    """Raise the user's high-water mark of tracked chunks in the document to chunk_id, never lowering it."""
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO public.reading_progress (userid, doc_id, max_chunk)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (userid, doc_id) DO UPDATE
+            SET max_chunk = GREATEST(public.reading_progress.max_chunk, EXCLUDED.max_chunk),
+                updated_at = CURRENT_TIMESTAMP;
+            """,
+            (str(user_id), doc_id, chunk_id)
+        )
+
+def reset_reading_progress(doc_id: int) -> None:
+    """
+    Forget all high-water marks of the document, e.g. after new objects were
+    extracted for chunks users have already read.
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM public.reading_progress WHERE doc_id = %s", (doc_id,))
+
+def track_reading(user_id: str, doc_id: int, chunk_id: int) -> int:
+    """
+    Record that the user has read the document up to chunk_id and assign only
+    objects in the newly covered interval. Returns the number of assigned objects.
+    The mark only moves once the assignment succeeded, so a failed call is repaired by the next one.
+    """
+    previous = get_reading_progress(user_id, doc_id)
+    if chunk_id <= previous:
+        logger.info(f"Chunk {chunk_id} of doc {doc_id} already tracked for user {user_id} (mark {previous})")
+        return 0
+    assigned = assign_objects(user_id, chunk_id, doc_id, previous)
+    advance_reading_progress(user_id, doc_id, chunk_id)
+    if assigned:
+        invalidate_mastery(doc_id, user_id)
+        invalidate_due_count(user_id)
+    return assigned
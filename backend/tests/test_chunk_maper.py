@@ -0,0 +1,141 @@
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.chunk_maper import assign_pages, from_content_to_pages, page_starts, read_content_list
+
+
+def baseline_pages(df):
+    """The original row-by-row conversion, kept as the reference output."""
+    pages, current = [], ""
+    for i in range(len(df)):
+        if df.loc[i, "page_idx"] != len(pages):
+            pages.append(current)
+            current = ""
+        current += "\n\n" if df.loc[i, "text"] != "" else ""
+        if pd.isna(df.loc[i, "text_level"]):
+            current += df.loc[i, "text"].strip()
+        else:
+            current += "#" * int(df.loc[i, "text_level"]) + " " + df.loc[i, "text"].strip()
+    pages.append(current)
+    return pages
+
+
+def random_items(rng):
+    items, page = [], 0
+    for _ in range(rng.randint(1, 60)):
+        # Pages may be skipped entirely, as for image-only pages
+        page += rng.choice([0, 0, 0, 1, 2])
+        item = {"type": "text", "page_idx": page, "text": rng.choice(["", " a ", "Theorem 1.", "x\n", "Proof. ∀ y"])}
+        if rng.random() < 0.2:
+            item["text_level"] = rng.randint(1, 3)
+        if rng.random() < 0.1:
+            item["bbox"] = [0, 0, 10, 10]
+        items.append(item)
+    return items
+
+
+def write_items(path, items, indent=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(items, f, ensure_ascii=False, indent=indent)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_read_content_list_matches_read_json(tmp_path, seed):
+    items = random_items(random.Random(seed))
+    path = tmp_path / "content_list.json"
+    write_items(path, items, indent=4 if seed % 2 else None)
+    # Tiny blocks force items to straddle reads
+    df = read_content_list(str(path), block_size=7)
+    expected = pd.read_json(path)
+    assert df["page_idx"].tolist() == expected["page_idx"].tolist()
+    assert df["text"].tolist() == expected["text"].tolist()
+    if "text_level" in expected:
+        assert np.array_equal(df["text_level"].to_numpy(), expected["text_level"].to_numpy(), equal_nan=True)
+    else:
+        assert df["text_level"].isna().all()
+
+
+def test_read_content_list_rejects_non_arrays(tmp_path):
+    path = tmp_path / "content_list.json"
+    path.write_text('{"page_idx": 0}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_content_list(str(path))
+
+
+def test_read_content_list_empty(tmp_path):
+    path = tmp_path / "content_list.json"
+    path.write_text("[]", encoding="utf-8")
+    assert len(read_content_list(str(path))) == 0
+    assert from_content_to_pages(read_content_list(str(path))) == [""]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_pages_match_baseline(tmp_path, seed):
+    items = random_items(random.Random(seed))
+    path = tmp_path / "content_list.json"
+    write_items(path, items)
+    df = read_content_list(str(path))
+    assert from_content_to_pages(df) == baseline_pages(df)
+
+
+def test_assign_pages_consecutive_chunks():
+    # Pages [0, 10), [10, 15), [15, 30); each chunk goes to the page of its last character
+    assert assign_pages([10, 5, 15], ["x" * 10, "x" * 3, "x" * 3, "x" * 14]) == [0, 1, 2, 2]
+
+
+def test_assign_pages_offsets():
+    offsets = [(0, 4), (9, 11), (12, 15), (20, 40)]
+    chunks = ["x" * (end - start) for start, end in offsets]
+    # Chunks past the last page are clipped to it
+    assert assign_pages([10, 5, 15], chunks, offsets) == [0, 1, 1, 2]
+
+
+def content_and_markdown(rng):
+    rows, markdown, owners, page = [], "", [], 0
+    for i in range(rng.randint(1, 40)):
+        page += rng.choice([0, 0, 0, 1, 2])
+        text = f"item {i} " + " ".join(rng.choice(["alpha", "beta", "x = 1", "Lemma."]) for _ in range(rng.randint(1, 8)))
+        level = rng.choice([None, None, None, 1, 2])
+        piece = "\n\n" + ("#" * level + " " if level else "") + text
+        # Each character of the text belongs to item i; separators and header marks before it may
+        # belong to the previous page
+        owners += [None] * (len(piece) - len(text)) + [i] * len(text)
+        markdown += piece
+        rows.append({"page_idx": page, "text": text, "text_level": level})
+    df = pd.DataFrame(rows)
+    df["text_level"] = pd.to_numeric(df["text_level"])
+    return df, markdown, owners
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_page_starts_map_chunk_offsets_to_pages(seed):
+    rng = random.Random(seed)
+    df, markdown, owners = content_and_markdown(rng)
+    starts = page_starts(markdown, df)
+    assert starts[0] == 0 and np.all(np.diff(starts) >= 0)
+    cuts = sorted(rng.sample(range(1, len(markdown)), min(12, len(markdown) - 1)))
+    offsets = list(zip([0] + cuts, cuts + [len(markdown)]))
+    chunks = [markdown[start:end] for start, end in offsets]
+    pages = assign_pages(np.diff(np.append(starts, len(markdown))).tolist(), chunks, offsets)
+    # Page numbers follow from_content_to_pages: an item starts a new page whenever its
+    # page_idx differs from the number of pages completed so far
+    item_pages, completed = [], 0
+    for page_idx in df["page_idx"]:
+        if page_idx != completed:
+            completed += 1
+        item_pages.append(completed)
+    for page, (start, end) in zip(pages, offsets):
+        owner = owners[end - 1]
+        if owner is not None:
+            assert page == item_pages[owner]
+
+
+def test_page_starts_skip_items_missing_from_markdown():
+    df = pd.DataFrame({"page_idx": [0, 1, 2], "text": ["first", "not in markdown", "third"], "text_level": [np.nan] * 3})
+    markdown = "first\n\n![](images/a.jpg)\n\nthird"
+    # Page 1 has no located item, so it is empty and starts where page 2 does
+    assert page_starts(markdown, df).tolist() == [0, markdown.index("third"), markdown.index("third")]
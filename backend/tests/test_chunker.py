@@ -0,0 +1,99 @@
+import random
+import re
+
+import pytest
+
+from src.chunker import LowerBoundChunker, SentenceChunker, SimpleChunker
+
+
+class BaselineSentenceChunker:
+    """The original multi-pass sentence splitter, kept as the reference output."""
+    abbreviations = {
+        'e.g.', 'i.e.', 'etc.', 'vs.', 'cf.', 'viz.', 'ex.', 'inc.',
+        'Mr.', 'Mrs.', 'Ms.', 'Dr.', 'Prof.', 'Sr.', 'Jr.', 'St.',
+        'Ltd.', 'Co.', 'Corp.', 'Inc.', 'LLC', 'U.S.', 'U.K.',
+        'D.C.', 'E.U.', 'A.I.'
+    }
+    abbrev_pattern = re.compile(r'(?:' + '|'.join(map(re.escape, abbreviations)) + r')\s*$')
+    sentence_end_re = re.compile(r'[.!?]+(?:[\'")\]]+)?(?=(?:\s*\n*\s*[A-Z]|$))')
+
+    def _ends_with_abbreviation(self, text):
+        return bool(self.abbrev_pattern.search(text) or re.search(r'\b[A-Z]\.\s*$', text)
+                    or re.search(r'\b(?:[A-Z]\.){2,}\s*$', text))
+
+    def chunk(self, text):
+        sentences, start = [], 0
+        for match in self.sentence_end_re.finditer(text):
+            if not self._ends_with_abbreviation(text[start:match.end()]):
+                sentences.append(text[start:match.end()])
+                start = match.end()
+        if start < len(text):
+            sentences.append(text[start:])
+        return sentences
+
+
+def baseline_lower_bound_chunks(text, lower_bound):
+    chunks, current = [], ""
+    for sentence in BaselineSentenceChunker().chunk(text):
+        if len(current) >= lower_bound:
+            chunks.append(current)
+            current = ""
+        current += sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+pieces = [
+    "The theorem holds.", "Let x be real!", "Is it finite?", "See e.g. the proof.", "Mr. Smith wrote it.",
+    "Work by J. R. R. Tolkien.", "It was in the U.S. first.", "Ask Dr. Who.", "Done...", "(Quoted.)",
+    "\"Really?\"", "lowercase. continues", "A.I. is here.", "etc. and so on", "Numbers 3.14 stay.",
+    "\n\n", " ", "Title\n", "End", "Q. E. D.", "Vol. II.", "x.Y", "ends with LLC"
+]
+
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(pieces) + rng.choice(["", " ", "\n"]) for _ in range(rng.randint(0, 60)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("text", random_texts(300))
+def test_sentences_match_baseline(text):
+    assert SentenceChunker().chunk(text) == BaselineSentenceChunker().chunk(text)
+
+
+@pytest.mark.parametrize("lower_bound", [1, 50, 200, 1000])
+def test_chunks_match_baseline(lower_bound):
+    for text in random_texts(200, seed=lower_bound):
+        assert LowerBoundChunker(lower_bound).chunk(text) == baseline_lower_bound_chunks(text, lower_bound)
+
+
+@pytest.mark.parametrize("lower_bound", [1, 50, 200])
+def test_chunk_offsets(lower_bound):
+    for text in random_texts(200, seed=lower_bound + 1):
+        previous_end = 0
+        for chunk, start, end in LowerBoundChunker(lower_bound).iter_chunks(text):
+            assert text[start:end] == chunk
+            # Chunks are consecutive and cover the whole text
+            assert start == previous_end
+            previous_end = end
+        assert previous_end == len(text)
+
+
+def test_sentence_offsets_cover_text():
+    for text in random_texts(100, seed=7):
+        spans = list(SentenceChunker().iter_sentences(text))
+        assert "".join(text[start:end] for start, end in spans) == text
+
+
+def test_simple_chunker_offsets():
+    text = "abcdefghij"
+    chunks = list(SimpleChunker(chunk_size=4, stride=3).iter_chunks(text))
+    assert [chunk for chunk, _, _ in chunks] == ["abcd", "defg", "ghij", "j"]
+    assert all(text[start:end] == chunk for chunk, start, end in chunks)
+
+
+def test_empty_text():
+    assert LowerBoundChunker().chunk("") == []
+    assert SentenceChunker().chunk("") == []
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src import due_queue as due_queue_module
+from src.due_queue import DueQueue
+
+now = datetime.now(timezone.utc)
+
+
+class FakeDateTime:
+    def __init__(self, value):
+        self.value = value
+
+    def to_native(self):
+        return self.value
+
+
+class FakeDriver:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute_query(self, query, **params):
+        self.queries += 1
+        return SimpleNamespace(records=[
+            {"node_id": node_id, "doc_id": doc_id, "next_repeat": FakeDateTime(next_repeat)}
+            for node_id, doc_id, next_repeat in self.rows
+        ])
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    # n0 is the most overdue; n5 is not due yet
+    rows = [(f"n{i}", 1 if i % 2 == 0 else 2, now - timedelta(hours=5 - i)) for i in range(5)]
+    rows.append(("n5", 1, now + timedelta(hours=1)))
+    fake = FakeDriver(rows)
+    monkeypatch.setattr(due_queue_module, "driver", fake)
+    return fake
+
+
+def test_most_overdue_first(driver):
+    queue = DueQueue()
+    assert queue.pop_due("u", 3) == ["n0", "n1", "n2"]
+    # Items stay queued until their next_repeat moves
+    assert queue.pop_due("u", 3) == ["n0", "n1", "n2"]
+    assert queue.pop_due("u", 10) == ["n0", "n1", "n2", "n3", "n4"]
+    assert driver.queries == 1
+
+
+def test_doc_filter(driver):
+    assert DueQueue().pop_due("u", 10, doc_id=2) == ["n1", "n3"]
+
+
+def test_stale_entries_are_skipped(driver):
+    queue = DueQueue()
+    queue.pop_due("u", 1)
+    queue.update("u", "n0", 1, now + timedelta(days=1))
+    queue.update("u", "n1", 2, now - timedelta(days=1))
+    # n0's old entry is stale; n1 moved to the front
+    assert queue.pop_due("u", 3) == ["n1", "n2", "n3"]
+
+
+def test_remove(driver):
+    queue = DueQueue()
+    queue.pop_due("u", 1)
+    queue.remove("u", "n0")
+    assert queue.pop_due("u", 2) == ["n1", "n2"]
+
+
+def test_update_of_unloaded_user_is_ignored(driver):
+    queue = DueQueue()
+    queue.update("u", "n0", 1, now + timedelta(days=1))
+    assert queue.pop_due("u", 1) == ["n0"]
+
+
+def test_refresh_reloads_from_graph(driver):
+    queue = DueQueue(refresh_seconds=0)
+    queue.pop_due("u", 1)
+    queue.remove("u", "n0")
+    assert queue.pop_due("u", 1) == ["n0"]
+    assert driver.queries == 2
+
+
+def test_compaction_keeps_current_entries(driver):
+    queue = DueQueue()
+    queue.pop_due("u", 1)
+    for i in range(500):
+        queue.update("u", "n4", 1, now - timedelta(hours=10, seconds=i))
+    assert queue.pop_due("u", 2) == ["n4", "n0"]
+    assert queue.stats()["entries"] < 200
+
+
+def test_idle_and_lru_eviction(driver):
+    queue = DueQueue(max_users=2)
+    for user in ("a", "b", "c"):
+        queue.pop_due(user, 1)
+    assert queue.stats()["users"] == 2
+    assert queue.stats()["evictions"] == 1
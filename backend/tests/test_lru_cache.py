@@ -0,0 +1,67 @@
+import pytest
+
+from src.lru_cache import ByteLRUCache
+
+
+def make_cache(max_bytes=10):
+    return ByteLRUCache(max_bytes, len)
+
+
+def test_evicts_least_recently_used():
+    cache = make_cache()
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    assert cache.get("a") == "xxxx"
+    cache.put("c", "xxxx")
+    assert cache.peek("b") is None
+    assert cache.peek("a") == "xxxx" and cache.peek("c") == "xxxx"
+    stats = cache.stats()
+    assert stats["bytes"] == 8 and stats["entries"] == 2 and stats["evictions"] == 1
+
+
+def test_peek_does_not_touch_recency_or_counters():
+    cache = make_cache()
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.peek("a")
+    cache.put("c", "xxxx")
+    assert cache.peek("a") is None
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_replacing_a_key_updates_size():
+    cache = make_cache()
+    cache.put("a", "xxxxxxxx")
+    cache.put("a", "xx")
+    cache.put("b", "xxxxxxxx")
+    assert cache.peek("a") == "xx"
+    assert cache.stats()["bytes"] == 10
+
+
+def test_oversized_values_are_not_cached():
+    cache = make_cache()
+    cache.put("a", "x" * 11)
+    assert cache.peek("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_pop_and_invalidate():
+    cache = make_cache(100)
+    for key in [(1, 1), (1, 2), (2, 1)]:
+        cache.put(key, "xx")
+    assert cache.pop((2, 1)) == "xx"
+    assert cache.pop((2, 1)) is None
+    assert cache.invalidate(lambda key: key[0] == 1) == 2
+    stats = cache.stats()
+    assert stats["entries"] == 0 and stats["bytes"] == 0 and stats["invalidations"] == 3
+
+
+@pytest.mark.parametrize("hits, misses, rate", [(0, 0, 0.0), (3, 1, 0.75)])
+def test_hit_rate(hits, misses, rate):
+    cache = make_cache()
+    cache.put("a", "x")
+    for _ in range(hits):
+        cache.get("a")
+    for _ in range(misses):
+        cache.get("missing")
+    assert cache.stats()["hit_rate"] == rate
@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from src import pg_connection
+from src.pg_connection import ConnectionPool, PoolClosed, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise RuntimeError("connection lost")
+        self.conn.executed.append(sql)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.commits = 0
+        self.rollbacks = 0
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    connections = []
+
+    def get_connection():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(pg_connection, "get_connection", get_connection)
+    return connections
+
+
+def test_returned_connection_is_reused(opened):
+    pool = ConnectionPool(max_size=2, timeout=1, health_check_after=30)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(opened) == 1
+    assert first.commits == 2
+    stats = pool.stats()
+    assert stats["checkouts"] == 2
+    assert stats["size"] == 1 and stats["idle"] == 1 and stats["in_use"] == 0
+
+
+def test_error_rolls_back_and_returns_connection(opened):
+    pool = ConnectionPool(max_size=1, timeout=1, health_check_after=30)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("boom")
+    assert conn.rollbacks == 1 and conn.commits == 0
+    assert pool.stats()["idle"] == 1
+
+
+def test_checkout_times_out_when_exhausted(opened):
+    pool = ConnectionPool(max_size=1, timeout=0.05, health_check_after=30)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_connection_when_returned(opened):
+    pool = ConnectionPool(max_size=1, timeout=5, health_check_after=30)
+    borrowed = []
+
+    def waiter():
+        with pool.connection() as conn:
+            borrowed.append(conn)
+
+    with pool.connection() as held:
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+    thread.join(timeout=5)
+    assert borrowed == [held]
+    assert pool.stats()["waits"] == 1
+
+
+def test_stale_idle_connection_is_pinged(opened):
+    pool = ConnectionPool(max_size=1, timeout=1, health_check_after=0)
+    with pool.connection():
+        pass
+    with pool.connection() as conn:
+        pass
+    assert conn.executed == ["SELECT 1"]
+
+
+def test_unhealthy_connection_is_replaced(opened):
+    pool = ConnectionPool(max_size=1, timeout=1, health_check_after=0)
+    with pool.connection() as first:
+        pass
+    first.broken = True
+    with pool.connection() as second:
+        pass
+    assert second is not first
+    assert first.closed
+    assert pool.stats()["discarded"] == 1 and pool.stats()["size"] == 1
+
+
+def test_close_all_wakes_waiters(opened):
+    pool = ConnectionPool(max_size=1, timeout=5, health_check_after=30)
+    errors = []
+
+    def waiter():
+        try:
+            with pool.connection():
+                pass
+        except PoolClosed as e:
+            errors.append(e)
+
+    with pool.connection() as held:
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        pool.close_all()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+    assert len(errors) == 1
+    # Returned after close: closed, not pooled
+    assert held.closed
+    assert pool.stats()["idle"] == 0
+    with pytest.raises(PoolClosed):
+        with pool.connection():
+            pass
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.range_requests import (
+    RangeNotSatisfiable, file_headers, http_date, is_not_modified, parse_range, quote_etag
+)
+
+size = 1000
+etag = '"abc-3e8"'
+last_modified = datetime(2024, 5, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+
+
+def parse(**headers):
+    return parse_range({key.replace("_", "-"): value for key, value in headers.items()}, size, etag, last_modified)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=999-999", (999, 999)),
+])
+def test_single_ranges(header, expected):
+    assert parse(range=header) == expected
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"range": "items=0-10"},
+    {"range": "bytes=0-10,20-30"},
+    {"range": "bytes=a-b"},
+])
+def test_whole_file(headers):
+    assert parse(**headers) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=10-5", "bytes=-0"])
+def test_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse(range=header)
+
+
+def test_if_range_matching_etag():
+    assert parse(range="bytes=0-9", if_range=etag) == (0, 9)
+
+
+def test_if_range_stale_etag_sends_whole_file():
+    assert parse(range="bytes=0-9", if_range='"other"') is None
+
+
+def test_if_range_date():
+    # HTTP dates have second precision, so the sub-second part of last_modified is ignored
+    assert parse(range="bytes=0-9", if_range=http_date(last_modified)) == (0, 9)
+    earlier = http_date(last_modified - timedelta(seconds=1))
+    assert parse(range="bytes=0-9", if_range=earlier) is None
+
+
+def test_not_modified():
+    assert is_not_modified({"if-none-match": etag}, etag, last_modified)
+    assert is_not_modified({"if-none-match": f'"x", W/{etag}'}, etag, last_modified)
+    assert is_not_modified({"if-none-match": "*"}, etag, last_modified)
+    assert not is_not_modified({"if-none-match": '"x"'}, etag, last_modified)
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified({"if-none-match": '"x"', "if-modified-since": http_date(last_modified)}, etag, last_modified)
+    assert is_not_modified({"if-modified-since": http_date(last_modified)}, etag, last_modified)
+    assert not is_not_modified({"if-modified-since": http_date(last_modified - timedelta(days=1))}, etag, last_modified)
+    assert not is_not_modified({}, etag, last_modified)
+
+
+def test_file_headers():
+    headers = file_headers(size, etag, last_modified, (100, 199))
+    assert headers["Content-Length"] == "100"
+    assert headers["Content-Range"] == "bytes 100-199/1000"
+    assert headers["Last-Modified"] == "Wed, 01 May 2024 12:00:00 GMT"
+    assert "Content-Range" not in file_headers(size, etag, last_modified)
+
+
+def test_quote_etag():
+    assert quote_etag("abc") == '"abc"'
+    assert quote_etag('"abc"') == '"abc"'
+    assert quote_etag('W/"abc"') == 'W/"abc"'
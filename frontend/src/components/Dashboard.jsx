@@ -1,6 +1,6 @@
 import React, { useState, useRef } from 'react'
 import { Upload, FileText, Brain, Clock, CheckCircle, Plus, AlertCircle } from 'lucide-react'
-import { api } from '../services/api'
+import { api, waitForIngestionJob } from '../services/api'
 import toast from 'react-hot-toast'
 import { useNavigate } from 'react-router-dom'
 import QuizGenerationModal from './QuizGenerationModal'
@@ -29,11 +29,18 @@ function Dashboard() {
         },
       })
       
-      const chunksCount = response?.data?.chunks_count
+      // Processing runs in the background; poll the job until it finishes
+      const job = await waitForIngestionJob(response.data.job_id)
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed')
+      }
+      const chunksCount = job.chunks_count
       toast.success(
-        chunksCount != null
-          ? `File processed successfully! Split into ${chunksCount} chunks.`
-          : 'File processed successfully!'
+        job.deduplicated
+          ? 'This file was already processed, reusing the existing document.'
+          : chunksCount != null
+            ? `File processed successfully! Split into ${chunksCount} chunks.`
+            : 'File processed successfully!'
       )
       fetchDocs()
       checkPendingItems()
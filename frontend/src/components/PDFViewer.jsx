@@ -23,8 +23,8 @@ const PDFViewer = ({ pdfUrl, currentPage, onPageChange, onTotalPagesChange }) =>
           window.pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js'
         }
 
-        // Load the PDF document
-        const loadingTask = window.pdfjsLib.getDocument(pdfUrl)
+        // Load the PDF document; pages are fetched with Range requests as they are rendered
+        const loadingTask = window.pdfjsLib.getDocument({ url: pdfUrl, disableAutoFetch: true })
         const pdf = await loadingTask.promise
         setPdfDoc(pdf)
         
@@ -62,6 +62,40 @@ export async function trackPage({ docId, chunkEnd, chunkStart, pageNumber, reade
   }
 }
 
+// Ingestion job status: { status, stage, stages, progress, doc_id, chunks_count, error }
+export async function getIngestionJob(jobId) {
+  const response = await api.get(`/ingestion_jobs/${jobId}`)
+  return response.data
+}
+
+// Poll an ingestion job until it is done or failed.
+// Throws if the job is not found, after maxErrors failed polls in a row, or after timeoutMs.
+export async function waitForIngestionJob(jobId, { intervalMs = 2000, timeoutMs = 30 * 60 * 1000, maxErrors = 5 } = {}) {
+  const deadline = Date.now() + timeoutMs
+  let errors = 0
+  while (true) {
+    try {
+      const job = await getIngestionJob(jobId)
+      errors = 0
+      if (job.status === 'done' || job.status === 'failed') {
+        return job
+      }
+    } catch (error) {
+      if (error.response?.status === 404) {
+        throw new Error(`Ingestion job ${jobId} not found`)
+      }
+      errors += 1
+      if (errors >= maxErrors) {
+        throw error
+      }
+    }
+    if (Date.now() + intervalMs > deadline) {
+      throw new Error(`Timed out waiting for ingestion job ${jobId}`)
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
+}
+
 // Quiz generation endpoints
 export async function getQuizParameters() {
   return api.post('/extract_objects_parameter')